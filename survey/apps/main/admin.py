@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from django.contrib import admin
-from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, VoiceOfCustomer
+from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, CovarianceAccumulator, VoiceOfCustomer
 
 
 class UserAdmin(admin.ModelAdmin):
@@ -20,7 +20,7 @@ class ComparisonTargetAdmin(admin.ModelAdmin):
 
 
 class SurveyAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title')
+    list_display = ('id', 'title', 'principal_components_count', 'completions_since_rotation_matrix')
     search_fields = ('title', )
     ordering = ('-id', )
 
@@ -56,8 +56,13 @@ class RotationMatrixAdmin(admin.ModelAdmin):
     ordering = ('-id', )
 
 
+class CovarianceAccumulatorAdmin(admin.ModelAdmin):
+    list_display = ('id', 'survey', 'questions_version', 'count', 'updated_at')
+    ordering = ('-id', )
+
+
 class ResultAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'survey', 'record', 'expected_target', 'category', 'x_axis_name', 'y_axis_name', 'is_public', 'created_at')
+    list_display = ('id', 'user', 'survey', 'record', 'record_version', 'expected_target', 'category', 'x_axis_name', 'y_axis_name', 'is_public', 'created_at')
     list_filter = ('created_at', )
     date_hierarchy = 'created_at'
     ordering = ('-id', )
@@ -79,4 +84,5 @@ admin.site.register(Choice, ChoiceAdmin)
 admin.site.register(Answer, AnswerAdmin)
 admin.site.register(Result, ResultAdmin)
 admin.site.register(RotationMatrix, RotationMatrixAdmin)
+admin.site.register(CovarianceAccumulator, CovarianceAccumulatorAdmin)
 admin.site.register(VoiceOfCustomer, VoiceOfCustomerAdmin)
@@ -0,0 +1,67 @@
+#!usr/bin/python
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.models import Survey
+from utils import utilities
+import numpy
+import time
+
+
+class Command(BaseCommand):
+    """
+    Compare 'randomized' PCA engine with 'eigh' on covariance of survey or on random covariance of given size
+    Eigenvalues and axes of both engines are compared, and randomized axes are validated with `PCA_AXES_TOLERANCE`
+    """
+    help = 'Benchmark PCA engines for rotation matrix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey-id', type=int)
+        parser.add_argument('--questions', type=int, default=500)
+        parser.add_argument('--components', type=int)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['survey_id'] is not None:
+            try:
+                survey = Survey.objects.get(id=options['survey_id'])
+            except Survey.DoesNotExist:
+                raise CommandError('Survey does not exist')
+
+            accumulator = utilities.get_covariance_accumulator(survey)
+            cov_mat = accumulator['squared_deviations'] / (accumulator['count'] - 1)
+            components_count = options['components'] or survey.principal_components_count
+        else:
+            # Answers of few latent tendencies with noise, clipped to range of factors
+            random_state = numpy.random.RandomState(getattr(settings, 'PCA_RANDOM_SEED'))
+            qnum = options['questions']
+            latent = random_state.standard_normal((qnum * 4, 3)).dot(random_state.standard_normal((3, qnum)) * 2)
+            factor_matrix = numpy.clip(numpy.round(latent + random_state.standard_normal(latent.shape)),
+                    getattr(settings, 'MIN_FACTOR_VALUE'), getattr(settings, 'MAX_FACTOR_VALUE'))
+            cov_mat = numpy.cov(factor_matrix.T)
+            components_count = options['components'] or 2
+
+        elapsed = {}
+        axes = {}
+        for engine in ('eigh', 'randomized'):
+            started_at = time.time()
+            for i in range(options['repeat']):
+                axes[engine] = utilities.get_principal_axes(cov_mat, components_count, engine)
+            elapsed[engine] = (time.time() - started_at) / options['repeat']
+            self.stdout.write(engine + ': ' + '%.6f' % elapsed[engine] + ' seconds')
+
+        eigh_vals, eigh_vecs = axes['eigh'][0][:components_count], axes['eigh'][1][:, :components_count]
+        # Randomized engine gives whole spectrum as well when it falls back to 'eigh'
+        randomized_vals, randomized_vecs = axes['randomized'][0][:components_count], axes['randomized'][1][:, :components_count]
+
+        # Sign of eigenvector is arbitrary, so axes are compared by absolute cosine
+        eigenvalue_error = (numpy.abs(eigh_vals - randomized_vals) / numpy.abs(eigh_vals).max()).max()
+        axis_error = (1 - numpy.abs((eigh_vecs * randomized_vecs).sum(axis=0))).max()
+
+        self.stdout.write('Questions: ' + str(cov_mat.shape[0]) + ', components: ' + str(components_count))
+        self.stdout.write('Speedup: ' + '%.2f' % (elapsed['eigh'] / max(elapsed['randomized'], 1e-9)))
+        self.stdout.write('Max relative eigenvalue error: ' + '%.3e' % eigenvalue_error)
+        self.stdout.write('Max axis error (1 - |cos|): ' + '%.3e' % axis_error)
+        self.stdout.write('Randomized axes valid: ' +
+                str(utilities.validate_principal_axes(cov_mat, randomized_vals, randomized_vecs)))
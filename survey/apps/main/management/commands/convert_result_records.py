@@ -0,0 +1,56 @@
+#!usr/bin/python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, TextField, Value, When
+from main.models import Result
+from utils import utilities
+
+
+class Command(BaseCommand):
+    """
+    Convert legacy result records into current record version in batches
+    Updated datetime of result is kept since it is compared with answers to reuse result
+    """
+    help = 'Convert legacy result records into JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        converted_count = 0
+        failed_id_list = []
+
+        while True:
+            results = list(Result.objects.filter(id__gt=last_id, record_version__lt=utilities.RECORD_VERSION)
+                    .order_by('id').values_list('id', 'record', 'record_version')[:batch_size])
+            if len(results) == 0:
+                break
+
+            last_id = results[-1][0]
+            records = {}
+            for result_id, record, record_version in results:
+                try:
+                    records[result_id] = utilities.serialize_record(utilities.deserialize_record(record, record_version))
+                except ValueError:
+                    # Legacy record including quotes can not be parsed
+                    failed_id_list.append(result_id)
+
+            if len(records) == 0:
+                continue
+
+            # QuerySet update does not touch updated datetime
+            with transaction.atomic():
+                Result.objects.filter(id__in=records.keys()).update(
+                        record=Case(*[When(id=result_id, then=Value(record)) for result_id, record in records.iteritems()],
+                            output_field=TextField()),
+                        record_version=utilities.RECORD_VERSION)
+
+            converted_count += len(records)
+            self.stdout.write('Converted ' + str(converted_count) + ' records (last ID: ' + str(last_id) + ')')
+
+        if len(failed_id_list) > 0:
+            self.stderr.write('Failed to convert records of results: ' + ', '.join(str(x) for x in failed_id_list))
@@ -0,0 +1,50 @@
+#!usr/bin/python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main.models import RotationMatrix
+from utils import utilities
+
+
+class Command(BaseCommand):
+    """
+    Convert legacy text matrices of rotation matrices into raw float64 buffers in batches
+    Updated datetime of rotation matrix is kept since it is compared with results to reuse them
+    """
+    help = 'Convert legacy rotation matrices into binary'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        converted_count = 0
+        failed_id_list = []
+
+        while True:
+            rotation_matrices = list(RotationMatrix.objects.filter(id__gt=last_id, matrix_data__isnull=True)
+                    .order_by('id').only('id', 'matrix', 'matrix_data')[:batch_size])
+            if len(rotation_matrices) == 0:
+                break
+
+            last_id = rotation_matrices[-1].id
+            packed_matrices = {}
+            for rotation_matrix in rotation_matrices:
+                try:
+                    packed_matrices[rotation_matrix.id] = utilities.pack_rotation_matrix(
+                            utilities.get_matrix_of_rotation_matrix(rotation_matrix))
+                except (SyntaxError, ValueError):
+                    failed_id_list.append(rotation_matrix.id)
+
+            # QuerySet update does not touch updated datetime
+            with transaction.atomic():
+                for rotation_matrix_id, packed_matrix in packed_matrices.iteritems():
+                    RotationMatrix.objects.filter(id=rotation_matrix_id).update(matrix='', **packed_matrix)
+
+            converted_count += len(packed_matrices)
+            self.stdout.write('Converted ' + str(converted_count) + ' rotation matrices (last ID: ' + str(last_id) + ')')
+
+        if len(failed_id_list) > 0:
+            self.stderr.write('Failed to convert rotation matrices: ' + ', '.join(str(x) for x in failed_id_list))
@@ -0,0 +1,111 @@
+#!usr/bin/python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from main.models import User, Survey
+from multiprocessing import Pool, cpu_count
+from utils import utilities
+import csv
+import json
+import os
+import shutil
+
+
+STATISTICS_FIELDS = ('sex', 'year_of_birth', 'political_tendency', 'supporting_party', 'factor_list', 'similarities')
+
+
+def export_shard(shard):
+    """
+    Write statistics of users in ID range of shard to its own part file row by row
+    Runs in worker process, so connections inherited from parent process are closed first
+    """
+    survey_id, min_user_id, max_user_id, output_format, path = shard
+    connections.close_all()
+
+    survey = Survey.objects.get(id=survey_id)
+    rows_count = 0
+    with open(path, 'wb') as f:
+        if output_format == 'csv':
+            writer = csv.writer(f)
+
+        for single_data in utilities.iterate_statistics(survey, min_user_id, max_user_id):
+            if output_format == 'csv':
+                writer.writerow([single_data[field] if isinstance(single_data[field], str) else json.dumps(single_data[field])
+                    for field in STATISTICS_FIELDS])
+            else:
+                f.write(json.dumps(single_data) + '\n')
+            rows_count += 1
+
+    return rows_count
+
+
+class Command(BaseCommand):
+    """
+    Export statistics of users who answered survey as NDJSON or CSV
+    User ID range is split into shards which are exported by pool of processes and merged in order
+    """
+    help = 'Export statistics of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey-id', type=int, required=True)
+        parser.add_argument('--min-user-id', type=int)
+        parser.add_argument('--max-user-id', type=int)
+        parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+        parser.add_argument('--shards', type=int, default=cpu_count() * 4)
+        parser.add_argument('--processes', type=int, default=cpu_count())
+        parser.add_argument('--output')
+
+    def handle(self, *args, **options):
+        try:
+            survey = Survey.objects.get(id=options['survey_id'])
+        except Survey.DoesNotExist:
+            raise CommandError('Survey does not exist')
+
+        user_id_range = User.objects.aggregate(Min('id'), Max('id'))
+        min_user_id = options['min_user_id'] or user_id_range['id__min']
+        max_user_id = options['max_user_id'] or user_id_range['id__max']
+        if min_user_id is None or max_user_id is None or min_user_id > max_user_id:
+            raise CommandError('Invalid user ID range')
+
+        # MySQL driver returns aggregated ID as long
+        min_user_id = int(min_user_id)
+        max_user_id = int(max_user_id)
+
+        output = options['output'] or 'statistics_' + str(survey.id) + '.' + options['format']
+
+        # Split ID range evenly, where shards are more than processes to balance uneven ranges
+        shards_count = max(1, min(options['shards'], max_user_id - min_user_id + 1))
+        shard_size = int((max_user_id - min_user_id + 1 + shards_count - 1) // shards_count)
+        shards = []
+        for index, shard_min_user_id in enumerate(range(min_user_id, max_user_id + 1, shard_size)):
+            shards.append((survey.id, shard_min_user_id, min(shard_min_user_id + shard_size - 1, max_user_id),
+                options['format'], output + '.part' + str(index)))
+
+        # Connections should not be shared with forked workers
+        connections.close_all()
+        pool = Pool(processes=options['processes'])
+        try:
+            rows_count = 0
+            for index, shard_rows_count in enumerate(pool.imap(export_shard, shards)):
+                rows_count += shard_rows_count
+                self.stdout.write('Exported shard ' + str(index + 1) + '/' + str(len(shards)) +
+                        ' (' + str(rows_count) + ' rows)')
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        # Merge part files in order of user ID
+        with open(output, 'wb') as f:
+            if options['format'] == 'csv':
+                csv.writer(f).writerow(STATISTICS_FIELDS)
+            for shard in shards:
+                with open(shard[4], 'rb') as part:
+                    shutil.copyfileobj(part, f)
+                os.remove(shard[4])
+
+        self.stdout.write('Exported ' + str(rows_count) + ' rows to ' + output)
@@ -0,0 +1,25 @@
+#!usr/bin/python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+from main.models import Survey
+from utils import utilities
+
+
+class Command(BaseCommand):
+    """
+    Rebuild participation bitmaps of surveys from participants table
+    """
+    help = 'Rebuild participation index of surveys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey-id', type=int)
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.all()
+        if options['survey_id'] is not None:
+            surveys = surveys.filter(id=options['survey_id'])
+
+        for survey in surveys:
+            participants_count = utilities.rebuild_participation_index(survey)
+            self.stdout.write('Survey ' + str(survey.id) + ': ' + str(participants_count) + ' participants')
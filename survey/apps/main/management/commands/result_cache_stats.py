@@ -0,0 +1,51 @@
+#!usr/bin/python
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+from django_redis import get_redis_connection
+from main.models import Survey
+from redis.exceptions import ResponseError
+from utils import utilities
+
+
+class Command(BaseCommand):
+    """
+    Print hit rate of shared result records by category to size `RESULT_CACHE_TTL` and memory of Redis
+    Records are evicted by least recently used only if Redis runs with `volatile-lru`, so eviction policy is checked as well
+    `allkeys-lru` is not recommended since it would evict keys without TTL such as answer buffers and counters as well
+    """
+    help = 'Print hit rate of result cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey-id', type=int)
+
+    def handle(self, *args, **options):
+        if options['survey_id'] is not None:
+            try:
+                surveys = [Survey.objects.get(id=options['survey_id'])]
+            except Survey.DoesNotExist:
+                raise CommandError('Survey does not exist')
+        else:
+            surveys = Survey.objects.all().order_by('id')
+
+        for survey in surveys:
+            stats = utilities.get_result_cache_stats(survey)
+            for category in sorted(stats.keys()):
+                hit_rate = stats[category]['hit_rate']
+                self.stdout.write('Survey ' + str(survey.id) + ' ' + category + ': ' +
+                        str(stats[category]['hits']) + ' hits, ' + str(stats[category]['misses']) + ' misses, hit rate ' +
+                        ('-' if hit_rate is None else '%.3f' % hit_rate))
+
+        # Managed Redis may disable CONFIG command, where policy should be checked in its console instead
+        try:
+            policy = get_redis_connection('default').config_get('maxmemory-policy').get('maxmemory-policy')
+        except ResponseError:
+            policy = None
+
+        if policy is None:
+            self.stderr.write('Could not read maxmemory-policy of Redis, which should be volatile-lru')
+        elif policy != 'volatile-lru':
+            self.stderr.write('Redis runs with maxmemory-policy ' + policy +
+                    ', but volatile-lru is needed to evict result records while keeping keys without TTL')
+        else:
+            self.stdout.write('Redis maxmemory-policy: ' + policy)
@@ -184,6 +184,17 @@ class Survey(models.Model):
         verbose_name = _('Title'),
         max_length = 255
     )
+    # Count of components kept in rotation matrix, where first two are used as axes of PCA result
+    principal_components_count = models.PositiveSmallIntegerField(
+        verbose_name = _('Principal components count'),
+        default = 2,
+        validators = [MinValueValidator(2)]
+    )
+    # Count of users who completed survey after latest rotation matrix is computed
+    completions_since_rotation_matrix = models.PositiveIntegerField(
+        verbose_name = _('Completions since rotation matrix'),
+        default = 0
+    )
     created_at = models.DateTimeField(
         verbose_name = _('Created datetime'),
         auto_now_add = True,
@@ -342,9 +353,28 @@ class RotationMatrix(models.Model):
         'Survey',
         related_name = 'rotation_matrices'
     )
+    # Legacy Python literal string of matrix which is converted into `matrix_data`
     matrix = models.TextField(
         verbose_name = _('Matrix'),
+        blank = True,
+        default = ''
     ) 
+    # Raw little-endian float64 buffer of matrix in row-major order
+    matrix_data = models.BinaryField(
+        verbose_name = _('Matrix data'),
+        blank = True,
+        null = True
+    )
+    matrix_rows = models.PositiveIntegerField(
+        verbose_name = _('Matrix rows'),
+        blank = True,
+        null = True
+    )
+    matrix_columns = models.PositiveIntegerField(
+        verbose_name = _('Matrix columns'),
+        blank = True,
+        null = True
+    )
     eigen_pairs = models.TextField(
         verbose_name = _('Eigen pairs'),
     ) 
@@ -386,6 +416,46 @@ class RotationMatrix(models.Model):
         return unicode(self.id) or u''
 
 
+class CovarianceAccumulator(models.Model):
+    """
+    Running mean and sum of squared deviations of factors of participants who answered all questions
+    Covariance of factors is sum of squared deviations divided by (count - 1)
+    """
+    survey = models.OneToOneField(
+        'Survey',
+        related_name = 'covariance_accumulator'
+    )
+    # Cache version of questions which orders columns of accumulator
+    questions_version = models.CharField(
+        verbose_name = _('Questions version'),
+        max_length = 32
+    )
+    count = models.PositiveIntegerField(
+        verbose_name = _('Count'),
+        default = 0
+    )
+    # Packed float64 vector of length of questions
+    mean = models.BinaryField(
+        verbose_name = _('Mean'),
+    )
+    # Packed float64 matrix of questions x questions
+    squared_deviations = models.BinaryField(
+        verbose_name = _('Sum of squared deviations'),
+    )
+    updated_at = models.DateTimeField(
+        verbose_name = _('Updated datetime'),
+        auto_now = True
+    )
+
+    class Meta:
+        verbose_name = _('Covariance accumulator')
+        verbose_name_plural = _('Covariance accumulators')
+        ordering = ['id']
+
+    def __unicode__(self):
+        return unicode(self.id) or u''
+
+
 class Result(models.Model):
     """
     Result of survey
@@ -401,6 +471,11 @@ class Result(models.Model):
     record = models.TextField(
         verbose_name = _('Record'),
     ) 
+    # Rows stored before version 2 are Python literal strings instead of JSON
+    record_version = models.PositiveSmallIntegerField(
+        verbose_name = _('Record version'),
+        default = 1
+    )
     expected_target = models.CharField(
         verbose_name = _('Expected target'),
         max_length = 255,
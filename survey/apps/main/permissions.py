@@ -98,13 +98,14 @@ class AnswerPermission(permissions.BasePermission):
     """
     List : authenticated user
     Create : authenticated user
+    Bulk create : authenticated user
     Retrieve : X
     Update : X
     Partial update : self
     Destroy : X
     """
     def has_permission(self, request, view):
-        if view.action in ['list', 'create']:
+        if view.action in ['list', 'create', 'bulk_create']:
             return request.user.is_authenticated()
         elif view.action == 'partial_update':
             return True
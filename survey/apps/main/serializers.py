@@ -68,7 +68,8 @@ class ResultSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Result
-        fields = ('id', 'user', 'survey', 'record', 'expected_target', 'category', 'x_axis_name', 'y_axis_name', 'is_public', 'updated_at')
+        fields = ('id', 'user', 'survey', 'record', 'record_version', 'expected_target', 'category', 'x_axis_name', 'y_axis_name', 'is_public', 'updated_at')
+        read_only_fields = ('record_version', )
 
 
 class VoiceOfCustomerSerializer(serializers.HyperlinkedModelSerializer):
@@ -3,12 +3,54 @@
 
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
 from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, VoiceOfCustomer
 from utils import redis, utilities
 
 
+@receiver(post_save, sender=Survey)
+def update_cache_version_when_survey_updated(sender, instance, created, **kwargs):
+    """
+    Update cache version of surveys when survey updated
+    """
+    utilities.update_cache_version('surveys', instance.updated_at)
+
+
+@receiver(m2m_changed, sender=Survey.participants.through)
+def update_participation_index_when_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Update participation bitmap and covariance accumulator when participants of survey changed
+    """
+    if action in ('post_add', 'post_remove'):
+        participated = action == 'post_add'
+        if reverse == False:
+            utilities.set_participation(instance.id, pk_set, participated)
+            utilities.update_covariance_of_participants(instance, pk_set, participated)
+        else:
+            for survey in Survey.objects.filter(id__in=pk_set):
+                utilities.set_participation(survey.id, [instance.id], participated)
+                utilities.update_covariance_of_participants(survey, [instance.id], participated)
+        
+        # Rotation matrix is recomputed once enough users completed survey
+        if participated == True:
+            if reverse == False:
+                utilities.increase_completions_since_rotation_matrix([instance.id], len(pk_set))
+            else:
+                utilities.increase_completions_since_rotation_matrix(pk_set, 1)
+    
+    # Participants should be read before they are cleared
+    elif action == 'pre_clear':
+        if reverse == False:
+            users_id_list = list(instance.participants.values_list('id', flat=True))
+            utilities.set_participation(instance.id, users_id_list, False)
+            utilities.update_covariance_of_participants(instance, users_id_list, False)
+        else:
+            for survey in instance.survey_set.all():
+                utilities.set_participation(survey.id, [instance.id], False)
+                utilities.update_covariance_of_participants(survey, [instance.id], False)
+
+
 @receiver(post_save, sender=Question)
 def update_cache_when_question_updated(sender, instance, created, **kwargs):
     """
@@ -40,7 +82,7 @@ def update_cache_when_comparison_target_updated(sender, instance, created, **kwa
     Update cache when comparision target updated
     """
     redis.set_comparison_target_list_cache(instance.survey)
-    if created == False and instance.user in instance.survey.participants.all():
+    if created == False and utilities.is_participant(instance.user, instance.survey):
         redis.set_survey_data_of_comparison_targets_cache(instance.survey)
 
 
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from django.conf.urls import url
-from main.views import UserViewSet, ComparisonTargetViewSet, SurveyViewSet, QuestionViewSet, AnswerViewSet, ResultViewSet, VoiceOfCustomerViewSet, get_records
+from main.views import UserViewSet, ComparisonTargetViewSet, SurveyViewSet, QuestionViewSet, AnswerViewSet, ResultViewSet, VoiceOfCustomerViewSet, get_records, get_result_status, get_distribution
 
 
 user_list = UserViewSet.as_view({
@@ -48,6 +48,9 @@ answer_list = AnswerViewSet.as_view({
     'get': 'list',
     'post': 'create'
 })
+answer_bulk = AnswerViewSet.as_view({
+    'post': 'bulk_create'
+})
 answer_detail = AnswerViewSet.as_view({
     'get': 'retrieve',
     'put': 'update',
@@ -122,6 +125,11 @@ urlpatterns = [
         answer_list,
         name='answer-list'
     ),
+    url(
+        r'^answers/bulk/$',
+        answer_bulk,
+        name='answer-bulk'
+    ),
     url(
         r'^answers/(?P<pk>[0-9]+)/$',
         answer_detail,
@@ -152,4 +160,12 @@ urlpatterns = [
         r'^records/(?P<question_id>[0-9]+)/$',
         get_records,
     ),
+    url(
+        r'^results/status/(?P<pending_id>[0-9a-f]+)/$',
+        get_result_status,
+    ),
+    url(
+        r'^distributions/(?P<survey_id>[0-9]+)/$',
+        get_distribution,
+    ),
 ]
@@ -5,14 +5,16 @@ from captcha.models import CaptchaStore
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
 from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, VoiceOfCustomer
 from main.permissions import UserPermission, ComparisonTargetPermission, SurveyPermission, QuestionPermission, AnswerPermission, ResultPermission, VoiceOfCustomerPermission
 from main.serializers import UserSerializer, ComparisonTargetSerializer, SurveySerializer, QuestionSerializer, AnswerSerializer, ResultSerializer, VoiceOfCustomerSerializer
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework.views import exception_handler
 from rest_framework_jwt.settings import api_settings
-from utils import redis, utilities
+from utils import cron, redis, utilities
 from uuid import uuid4
 
 
@@ -73,7 +75,7 @@ class UserViewSet(viewsets.ModelViewSet):
             except:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
             
-            if request.user in survey.participants.all():
+            if utilities.is_participant(request.user, survey):
                 serializer_data['completed_survey'] = True
         
         return Response(serializer_data)
@@ -111,18 +113,31 @@ class ComparisonTargetViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """
         List all comparison targets in specific survey
+        Respond `304 Not Modified` without querying survey if client has the latest list
         """
         try:
-            survey = Survey.objects.get(id=int(request.GET['survey_id']))
+            survey_id = int(request.GET['survey_id'])
         except:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
-        comparison_targets = cache.get('survey:' + str(survey.id) + ':comparison_targets:list')
-        if comparison_targets is not None:
-            return Response(comparison_targets)
-        else:
-            comparison_targets = redis.set_comparison_target_list_cache(survey)
-            return Response(comparison_targets)
+        key = 'survey:' + str(survey_id) + ':comparison_targets:list'
+        if request.accepted_renderer.format == 'json':
+            response = utilities.get_not_modified_rendered_response(request, key)
+            if response is not None:
+                return response
+        
+        try:
+            survey = Survey.objects.get(id=survey_id)
+        except:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        
+        # Serve pre-rendered JSON unless other format such as browsable API is requested
+        if request.accepted_renderer.format == 'json':
+            rendered_response = redis.get_cache(survey, redis.set_comparison_target_list_response_cache)
+            return utilities.get_rendered_response(request, rendered_response, utilities.get_cache_validators(key)[1])
+        
+        comparison_targets = redis.get_cache(survey, redis.set_comparison_target_list_cache)
+        return Response(comparison_targets)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -141,15 +156,35 @@ class SurveyViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """
         List all surveys
+        Respond `304 Not Modified` without querying surveys if client has the latest list
         """
+        version, last_modified = utilities.get_cache_validators('surveys')
+        response = utilities.get_not_modified_response(request, version, last_modified)
+        if response is not None:
+            return response
+        
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        
+        # Versioning starts from the first request after deployment
+        if version is None:
+            version = utilities.update_cache_version('surveys', max([survey.updated_at for survey in queryset] or [None]))
+        
+        return utilities.set_validators(Response(serializer.data), version, last_modified)
 
     def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve survey
+        Respond `304 Not Modified` without querying survey if client has the latest one
+        """
+        version, last_modified = utilities.get_cache_validators('surveys')
+        response = utilities.get_not_modified_response(request, version, last_modified)
+        if response is not None:
+            return response
+        
         instance = self.get_object()
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        return utilities.set_validators(Response(serializer.data), version, last_modified)
 
 
 class QuestionViewSet(viewsets.ModelViewSet):
@@ -163,18 +198,31 @@ class QuestionViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """
         List all questions in specific survey with choices
+        Respond `304 Not Modified` without querying survey if client has the latest list
         """
         try:
-            survey = Survey.objects.get(id=int(request.GET['survey_id']))
+            survey_id = int(request.GET['survey_id'])
         except:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
-        questions = cache.get('survey:' + str(survey.id) + ':questions')
-        if questions is not None:
-            return Response(questions)
-        else:
-            questions = redis.set_questions_cache(survey)
-            return Response(questions)
+        key = 'survey:' + str(survey_id) + ':questions'
+        if request.accepted_renderer.format == 'json':
+            response = utilities.get_not_modified_rendered_response(request, key)
+            if response is not None:
+                return response
+        
+        try:
+            survey = Survey.objects.get(id=survey_id)
+        except:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        
+        # Serve pre-rendered JSON unless other format such as browsable API is requested
+        if request.accepted_renderer.format == 'json':
+            rendered_response = redis.get_cache(survey, redis.set_questions_response_cache)
+            return utilities.get_rendered_response(request, rendered_response, utilities.get_cache_validators(key)[1])
+        
+        questions = redis.get_cache(survey, redis.set_questions_cache)
+        return Response(questions)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -184,7 +232,7 @@ class QuestionViewSet(viewsets.ModelViewSet):
 
 class AnswerViewSet(viewsets.ModelViewSet):
     """
-    Provides `list`, `create` and `partial update` actions for answer object
+    Provides `list`, `create`, `bulk create` and `partial update` actions for answer object
     """
     queryset = Answer.objects.select_related('choice').select_related('user').all()
     serializer_class = AnswerSerializer
@@ -209,10 +257,19 @@ class AnswerViewSet(viewsets.ModelViewSet):
         except:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
+        # Cached choice is used to update cached factor vector of user in place
+        cached_choice = utilities.get_choices_of_questions(utilities.get_questions_of_survey(survey))[choice.id]
+        
+        # Write answer to buffer which will be flushed to DB periodically
+        if getattr(settings, 'USE_ANSWER_BUFFER') == True:
+            utilities.buffer_answer(request.user.id, survey.id, question.id, choice.id)
+            utilities.update_factor_vector(request.user.id, survey.id, [cached_choice])
+            return Response(
+                    {'state': True, 'choice': choice.id, 'message': 'Answer buffered.'},
+                    status=status.HTTP_202_ACCEPTED)
+        
         # Get question count
-        questions_count = cache.get('survey:' + str(survey.id) + 'questions:count')
-        if questions_count is None:
-            questions_count = redis.set_questions_count_cache(survey)
+        questions_count = redis.get_cache(survey, redis.set_questions_count_cache)
         
         # Update if user already answered this question
         if Answer.objects.filter(user=request.user, choice__question_id=question.id).exists():
@@ -233,8 +290,11 @@ class AnswerViewSet(viewsets.ModelViewSet):
                     user.save()
             
             # Update choice
+            if answer.choice_id != choice.id:
+                utilities.update_choice_distribution(survey.id, {answer.choice_id: -1, choice.id: 1})
             answer.choice = choice
             answer.save()
+            utilities.update_factor_vector(request.user.id, survey.id, [cached_choice])
             
             return Response(status=status.HTTP_200_OK)
         
@@ -253,11 +313,60 @@ class AnswerViewSet(viewsets.ModelViewSet):
                 user.economic_score += choice.factor 
                 user.save()
         
+        utilities.update_choice_distribution(survey.id, {choice.id: 1})
+        utilities.update_factor_vector(request.user.id, survey.id, [cached_choice])
+        
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, choice_id=int(self.request.data['choice_id']))
 
+    def bulk_create(self, request, *args, **kwargs):
+        """
+        Create or update answers of whole survey at once
+        """
+        try:
+            survey = Survey.objects.get(id=int(request.data['survey_id']))
+            if hasattr(request.data, 'getlist'):
+                choice_id_list = [int(x) for x in request.data.getlist('choice_ids')]
+            else:
+                choice_id_list = [int(x) for x in request.data['choice_ids']]
+        except:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        
+        questions = redis.get_cache(survey, redis.set_questions_cache)
+        
+        # Validate choices with cached questions instead of querying each choice
+        choices = utilities.get_choices_of_questions(questions)
+        choice_list = []
+        questions_id_list = []
+        for choice_id in choice_id_list:
+            if choice_id not in choices:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            
+            # Prevent user to choose multiple choices in one question
+            choice = choices[choice_id]
+            if choice['question']['id'] in questions_id_list:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            
+            questions_id_list.append(choice['question']['id'])
+            choice_list.append(choice)
+        
+        # Buffered answers would be laid over and later overwrite answers written to DB directly, so buffer them together
+        if getattr(settings, 'USE_ANSWER_BUFFER') == True:
+            utilities.buffer_answers(request.user.id, survey.id, 
+                    dict((choice['question']['id'], choice['id']) for choice in choice_list))
+            utilities.update_factor_vector(request.user.id, survey.id, choice_list)
+            return Response(
+                    {'state': True, 'buffered': len(choice_list), 'message': 'Answers buffered.'},
+                    status=status.HTTP_202_ACCEPTED)
+        
+        created_count, updated_count = utilities.save_answers(request.user, survey, choice_list)
+        
+        return Response(
+                {'state': True, 'created': created_count, 'updated': updated_count},
+                status=status.HTTP_200_OK)
+
     def update(self, request, pk, *args, **kwargs):
         """
         Partially update answer
@@ -280,9 +389,24 @@ class AnswerViewSet(viewsets.ModelViewSet):
         if instance.choice.question.id != question.id:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
+        # Cached choice is used to update cached factor vector of user in place
+        cached_choice = utilities.get_choices_of_questions(utilities.get_questions_of_survey(survey))[choice.id]
+        
+        # Write answer to buffer which will be flushed to DB periodically
+        if getattr(settings, 'USE_ANSWER_BUFFER') == True:
+            utilities.buffer_answer(request.user.id, survey.id, question.id, choice.id)
+            utilities.update_factor_vector(request.user.id, survey.id, [cached_choice])
+            return Response(
+                    {'state': True, 'choice': choice.id, 'message': 'Answer buffered.'},
+                    status=status.HTTP_202_ACCEPTED)
+        
+        old_choice_id = instance.choice_id
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if old_choice_id != choice.id:
+            utilities.update_choice_distribution(survey.id, {old_choice_id: -1, choice.id: 1})
+        utilities.update_factor_vector(request.user.id, survey.id, [cached_choice], update_economic_score=False)
         return Response(serializer.data)
 
     def perform_update(self, serializer):
@@ -301,9 +425,13 @@ class ResultViewSet(viewsets.ModelViewSet):
         """
         Create result if result is not exist or updated datetime is past than the comparison target
         Otherwise get ID of existing result
+        Results of several categories are created from single load of inputs when comma separated `categories` is given
         """
         try:
-            category = request.data['category']
+            if 'categories' in request.data:
+                categories = request.data['categories'].split(',')
+            else:
+                categories = [request.data['category']]
         except:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
@@ -312,150 +440,56 @@ class ResultViewSet(viewsets.ModelViewSet):
         except:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            result = Result.objects.filter(survey=survey, category=category, user=request.user).latest('id')
-        except:
-            result = None
-        
-        # Choose 'unawareness' for unaswered questions
-        if request.user not in survey.participants.all():
-            all_questions = cache.get('survey:' + str(survey.id) + ':questions')
-            if all_questions is None:
-                all_questions = redis.set_questions_cache(survey)
-            all_questions_id_list = []
-            for i in range(0, len(all_questions)):
-                all_questions_id_list.append(all_questions[i]['id'])
-            
-            answered_questions_id_list = []
-            answers = Answer.objects.select_related('choice').filter(user=request.user, choice__question__survey=survey)
-            for answer in answers:
-                answered_questions_id_list.append(answer.choice.question.id)
-            
-            # Extract id list of unanswered question
-            unanswered_questions_id_list = list(set(all_questions_id_list) - set(answered_questions_id_list))
-            
-            # Choose 'unawareness' for unaswered questions, or choose randomly if failed
-            for unanswered_question_id in unanswered_questions_id_list:
-                question = Question.objects.prefetch_related('choices').get(id=unanswered_question_id)
-                try:
-                    Answer(user=request.user, choice=question.choices.filter(factor=7)[0]).save()
-                except:
-                    Answer(user=request.user, choice=question.choices.all().order_by('?')[0]).save()
-            
-            # Add user to participant list of survey
-            survey.participants.add(request.user)
-            
-        comparison_targets = cache.get('survey:'+ str(survey.id) + ':comparison_targets:data')
-        if comparison_targets is None:
-            comparison_targets = redis.set_survey_data_of_comparison_targets_cache(survey)
-        
-        # Data of comparison target
-        target_data = comparison_targets['data']
-        comparison_targets_updated_at = comparison_targets['updated_at']
-        
-        user_data = utilities.get_survey_data_of_user(request.user, survey)
-            
-        if category == 'factor_list':
-            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
-            #   (1) Result is exist
-            #   (2) User's answers are not updated after result object is created 
-            if result is not None and result.updated_at > user_data['updated_at']:
-                return Response(
-                        {'state': True, 'id': result.id, 'message': 'Result already exist.'},
-                        status=status.HTTP_200_OK)
-            
-            factor_list = user_data['factor_list']
-            record = ''
-            
-            # Get question count
-            questions_count = cache.get('survey:' + str(survey.id) + 'questions:count')
-            if questions_count is None:
-                questions_count = redis.set_questions_count_cache(survey)
-            
-            for i in range(0, min(len(factor_list), questions_count)):
-                record += str(i + 1) + '=' + str(factor_list[i]) + '&'
-            
-            record = record[:-1]
+        for category in categories:
+            if category not in [x[0] for x in getattr(settings, 'RESULT_CATEGORY_CHOICES')]:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
         
-        elif category == 'agreement_score':
-            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
-            #   (1) Result is exist
-            #   (2) User's answers are not updated after result object is created 
-            if result is not None and result.updated_at > user_data['updated_at']:
-                return Response(
-                        {'state': True, 'id': result.id, 'message': 'Result already exist.'},
-                        status=status.HTTP_200_OK)
+        # Enqueue computation and let client poll its status, while same request in flight is coalesced
+        #   Task in flight could finish between `add` and `get`, so try again, and compute synchronously if it keeps racing
+        if getattr(settings, 'USE_ASYNC_RESULT') == True:
+            key = utilities.get_result_task_key(request.user.id, survey.id, categories)
+            pending_id = None
+            for i in range(3):
+                new_pending_id = uuid4().hex
+                if cache.add(key, new_pending_id, timeout=getattr(settings, 'RESULT_TASK_TIMEOUT')):
+                    utilities.set_result_status(new_pending_id, request.user.id, 'PENDING')
+                    cron.create_result.delay(new_pending_id, request.user.id, survey.id, categories)
+                    pending_id = new_pending_id
+                    break
+                
+                pending_id = cache.get(key)
+                if pending_id is not None:
+                    break
             
-            user_data['name'] = '나'
-            record = utilities.get_agreement_score_result(user_data, *target_data)
-        
-        elif category == 'city_block_distance':
-            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
-            #   (1) Result is exist
-            #   (2) User's answers are not updated after result object is created 
-            #   (3) Answers of comparison targets are not updated after result object is created
-            if result is not None and \
-                    result.updated_at > user_data['updated_at'] and \
-                    result.updated_at > max(comparison_targets_updated_at):
+            if pending_id is not None:
                 return Response(
-                        {'state': True, 'id': result.id, 'message': 'Result already exist.'},
-                        status=status.HTTP_200_OK)
-            
-            questions_category = []
-            questions = cache.get('survey:' + str(survey.id) + ':questions')
-            for question in questions:
-                questions_category.append(question['subtitle'])
-            
-            record = utilities.get_city_block_distance_result(questions_category, user_data['factor_list'], *target_data)
-        
-        elif category == 'pca':
-            rotation_matrix = cache.get('survey:' + str(survey.id) + ':rotation_matrix')
-            if rotation_matrix is None:
-                try:
-                    rotation_matrix = redis.set_rotation_matrix_cache(survey)
-                except:
-                    return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
-            #   (1) Result is exist
-            #   (2) User's answers are not updated after result object is created 
-            #   (3) Answers of comparison targets are not updated after result object is created
-            #   (4) Rotation matrix is not updated after result object is created
-            if result is not None and \
-                    result.updated_at > user_data['updated_at'] and \
-                    result.updated_at > max(comparison_targets_updated_at) and \
-                    result.updated_at > rotation_matrix['updated_at']:
-                return Response(
-                        {'state': True, 'id': result.id, 'message': 'Result already exist.'},
-                        status=status.HTTP_200_OK)
-            
-            user_dict = {'name': '나',
-                'color': '#9b59b6',
-                'factor_list': user_data['factor_list']}
-            target_data.append(user_dict)
-            
-            record = utilities.get_pca_result(rotation_matrix['matrix'], *target_data)
-        else:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+                        {'state': True, 'pending_id': pending_id, 'message': 'Result pending.'},
+                        status=status.HTTP_202_ACCEPTED)
         
-        data = request.data
-        data['record'] = record
-        
-        if category == 'city_block_distance':
-            data['expected_target'] = request.user.supporting_party
-        elif category == 'pca':
-            data['x_axis_name'] = rotation_matrix['x_axis_name']
-            data['y_axis_name'] = rotation_matrix['y_axis_name']
+        try:
+            results = utilities.create_results(request.user, survey, categories)
+        except RotationMatrix.DoesNotExist:
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        if 'categories' in request.data:
+            if True in [created for result, created in results.values()]:
+                response_status = status.HTTP_201_CREATED
+            else:
+                response_status = status.HTTP_200_OK
+            return Response(
+                    {'state': True, 'ids': {category: result.id for category, (result, created) in results.iteritems()}},
+                    status=response_status)
+        
+        result, created = results[categories[0]]
+        if created == False:
+            return Response(
+                    {'state': True, 'id': result.id, 'message': 'Result already exist.'},
+                    status=status.HTTP_200_OK)
+        
+        serializer = self.get_serializer(result)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user, survey_id=int(self.request.data['survey_id']))
-
     def retrieve(self, request, pk, *args, **kwargs):
         """
         Retrieve result
@@ -530,16 +564,24 @@ class VoiceOfCustomerViewSet(viewsets.ModelViewSet):
 def get_records(request, question_id):
     """
     Get records of users and comparison targets
+    Respond `304 Not Modified` without querying question if neither records nor answers of user are changed
     """
+    etag = utilities.get_records_etag(request.user, cache.get('question:' + str(question_id) + ':survey_id'))
+    response = utilities.get_not_modified_response(request, etag)
+    if response is not None:
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
     try:
         question = Question.objects.get(id=question_id)
         survey = question.survey
     except:
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
-    comparison_targets = cache.get('survey:' + str(survey.id) + ':comparison_targets:records')
-    if comparison_targets is None:
-        comparison_targets = redis.set_records_of_comparison_targets_cache(survey)
+    # Question never moves to other survey
+    cache.set('question:' + str(question_id) + ':survey_id', survey.id, timeout=getattr(settings, 'CACHE_TTL'))
+
+    comparison_targets = redis.get_cache(survey, redis.set_records_of_comparison_targets_cache)
 
     data = []
 
@@ -549,13 +591,79 @@ def get_records(request, question_id):
             'choice_id': comparison_target['records'][question_id]})
 
     if request.user.is_authenticated():
-        answer = request.user.user_chosen_answers.select_related('choice').filter(choice__question=question)
-        try:
+        # Buffered answer which is not flushed to DB yet is latest one
+        answer_buffer = utilities.get_answer_buffer(request.user.id, survey.id)
+        if answer_buffer is not None and question.id in answer_buffer['answers']:
             data.append({'name': '나', 
                 'color': '#9b59b6', 
-                'choice_id': answer[0].choice.id})
-        # When user does not answered this question
-        except:
-            pass
+                'choice_id': answer_buffer['answers'][question.id]})
+        else:
+            answer = request.user.user_chosen_answers.select_related('choice').filter(choice__question=question)
+            try:
+                data.append({'name': '나', 
+                    'color': '#9b59b6', 
+                    'choice_id': answer[0].choice.id})
+            # When user does not answered this question
+            except:
+                pass
 
+    response = utilities.set_validators(Response(data), utilities.get_records_etag(request.user, survey.id))
+    patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
+
+
+@api_view(['GET'])
+def get_result_status(request, pending_id):
+    """
+    Get status of results which are being created in background
+    IDs of results by category are given when its state is 'SUCCESS'
+    """
+    result_status = utilities.get_result_status(pending_id)
+    if result_status is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    
+    if result_status['user'] != request.user.id:
+        return Response(status=status.HTTP_403_FORBIDDEN)
+    
+    data = {'state': result_status['state'], 'ids': result_status['ids']}
+    
+    # ID of single result is given as `id` as well
+    if result_status['ids'] is not None and len(result_status['ids']) == 1:
+        data['id'] = result_status['ids'].values()[0]
+    
     return Response(data)
+
+
+@api_view(['GET'])
+def get_distribution(request, survey_id):
+    """
+    Get count of answers of each choice of whole questions in survey
+    Counts are read from counters in Redis instead of grouping answers table
+    """
+    try:
+        survey = Survey.objects.get(id=int(survey_id))
+    except:
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    questions = redis.get_cache(survey, redis.set_questions_cache)
+    counts = utilities.get_choice_distribution(survey)
+
+    data = []
+    for question in questions:
+        data.append({'question_id': question['id'], 
+            'choices': [{'choice_id': choice['id'], 'count': counts.get(choice['id'], 0)} for choice in question['choices']]})
+
+    return Response(data)
+
+
+def handle_exception(exc, context):
+    """
+    Exception handler of REST framework which lets client retry while cache is being rebuilt by another process
+    """
+    if isinstance(exc, redis.CacheBuildTimeout):
+        return Response(
+                {'state': False, 'message': 'Server is busy. Try again later.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(getattr(settings, 'CACHE_BUILD_WAIT'))})
+
+    return exception_handler(exc, context)
@@ -3,6 +3,9 @@
 
 from captcha.models import CaptchaStore
 from celery import task
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
 from django.utils import timezone
 from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, VoiceOfCustomer
 from utils import utilities
@@ -20,13 +23,107 @@ def clear_expired_captcha():
 @task()
 def create_rotation_matrix():
     """
-    Create rotation matrix
+    Create rotation matrix of surveys which enough users completed after latest rotation matrix
+    New rotation matrix is saved only if its principal axes drift from latest one beyond tolerance
     """
     surveys = Survey.objects.all()
     for survey in surveys:
+        completions_count = survey.completions_since_rotation_matrix
+        try:
+            latest_rotation_matrix = RotationMatrix.objects.filter(survey=survey).latest('id')
+            latest_matrix = utilities.get_matrix_of_rotation_matrix(latest_rotation_matrix)
+        except RotationMatrix.DoesNotExist:
+            latest_matrix = None
+        
+        # Rotation matrix of other questions can not be used any more regardless of completions
+        if latest_matrix is not None and \
+                latest_matrix.shape[0] == Question.objects.filter(survey=survey).count() and \
+                completions_count < getattr(settings, 'ROTATION_MATRIX_MIN_COMPLETIONS'):
+            continue
+        
         rotation_matrix = utilities.get_rotation_matrix(survey)
+        
+        # Completions while computing are left for next time
+        Survey.objects.filter(id=survey.id).\
+            update(completions_since_rotation_matrix=F('completions_since_rotation_matrix') - completions_count)
+        
+        if latest_matrix is not None and \
+                utilities.get_rotation_matrix_drift(latest_matrix, rotation_matrix[0]) <= \
+                getattr(settings, 'ROTATION_MATRIX_DRIFT_TOLERANCE'):
+            continue
+        
         RotationMatrix(survey=survey,
-                matrix=rotation_matrix[0], 
                 eigen_pairs=rotation_matrix[1],
-                cumulated_accuracy_value=rotation_matrix[2]).save()
+                cumulated_accuracy_value=rotation_matrix[2],
+                **utilities.pack_rotation_matrix(rotation_matrix[0])).save()
+    return None
+
+
+@task()
+def flush_answer_buffers():
+    """
+    Flush buffered answers to DB in batches
+    """
+    batch_size = getattr(settings, 'ANSWER_BUFFER_FLUSH_BATCH_SIZE')
+    users_id_lists = {}
+
+    # Key of answer buffer looks like 'survey:<survey ID>:answer_buffer:<user ID>'
+    for key in cache.iter_keys('survey:*:answer_buffer:*'):
+        key_parts = key.split(':')
+        if len(key_parts) != 4:
+            continue
+        
+        survey_id = int(key_parts[1])
+        users_id_list = users_id_lists.setdefault(survey_id, [])
+        users_id_list.append(int(key_parts[3]))
+        
+        if len(users_id_list) >= batch_size:
+            utilities.flush_answer_buffers(Survey.objects.get(id=survey_id), users_id_list)
+            users_id_lists[survey_id] = []
+
+    for survey_id, users_id_list in users_id_lists.iteritems():
+        if len(users_id_list) > 0:
+            utilities.flush_answer_buffers(Survey.objects.get(id=survey_id), users_id_list)
+    return None
+
+
+@task()
+def create_result(pending_id, user_id, survey_id, categories):
+    """
+    Create results in background and record their status to be polled by client
+    """
+    key = utilities.get_result_task_key(user_id, survey_id, categories)
+    try:
+        results = utilities.create_results(User.objects.get(id=user_id), Survey.objects.get(id=survey_id), categories)
+        utilities.set_result_status(pending_id, user_id, 'SUCCESS', 
+                {category: result.id for category, (result, created) in results.iteritems()})
+    except:
+        utilities.set_result_status(pending_id, user_id, 'FAILURE')
+        raise
+    finally:
+        # Same request is not coalesced into this task any more
+        if cache.get(key) == pending_id:
+            cache.delete(key)
+    return None
+
+
+@task()
+def create_analytics_snapshots():
+    """
+    Append users who completed surveys after latest analytics snapshot
+    """
+    surveys = Survey.objects.all()
+    for survey in surveys:
+        utilities.create_analytics_snapshot(survey)
+    return None
+
+
+@task()
+def reconcile_choice_distributions():
+    """
+    Rebuild counters of answers of each choice from answers table to correct drift of counters
+    """
+    surveys = Survey.objects.all()
+    for survey in surveys:
+        utilities.rebuild_choice_distribution(survey)
     return None
@@ -1,15 +1,348 @@
 #!usr/bin/python
 # -*- coding:utf-8 -*-
 
-from ast import literal_eval
+from collections import OrderedDict
 from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
+from django_redis import get_redis_connection
+from functools import wraps
 from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, VoiceOfCustomer
 from main.serializers import UserSerializer, ComparisonTargetSerializer, SurveySerializer, QuestionSerializer, AnswerSerializer, ResultSerializer, VoiceOfCustomerSerializer
 from utils import utilities
+from uuid import uuid4
+import math
 import numpy
+import os
+import random
+import threading
+import time
 
 
+class LocalCache(object):
+    """
+    Bounded LRU cache in memory of each process in front of Redis
+    Entries are stamped with generation of their survey when read from Redis
+    Invalidating a survey only increases its generation, so stale entries are ignored and evicted later
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.survey_generations = {}
+        self.lock = threading.Lock()
+
+    def get_stamp(self, survey_id):
+        with self.lock:
+            return (self.generation, self.survey_generations.get(survey_id, 0))
+
+    def get(self, key, survey_id):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            
+            stamp, stored_at, value = entry
+            if stamp != (self.generation, self.survey_generations.get(survey_id, 0)) or time.time() - stored_at > self.ttl:
+                return None
+            
+            # Mark as recently used
+            self.entries[key] = entry
+            return value
+
+    def set(self, key, survey_id, value, stamp):
+        with self.lock:
+            # Value read before invalidation must not be stored
+            if stamp != (self.generation, self.survey_generations.get(survey_id, 0)):
+                return
+            
+            self.entries.pop(key, None)
+            self.entries[key] = (stamp, time.time(), value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, survey_id):
+        with self.lock:
+            self.survey_generations[survey_id] = self.survey_generations.get(survey_id, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+local_cache = LocalCache(getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES'), getattr(settings, 'LOCAL_CACHE_TTL'))
+subscriber = {'pid': None, 'lock': threading.Lock()}
+shared_matrices = {}
+
+
+def listen_cache_invalidation():
+    """
+    Drop local cache entries of survey whenever any process publishes its ID
+    Messages published while disconnected are lost, so whole local cache is cleared on (re)connection
+    """
+    while True:
+        try:
+            pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(getattr(settings, 'CACHE_INVALIDATION_CHANNEL'))
+            local_cache.clear()
+            for message in pubsub.listen():
+                local_cache.invalidate(int(message['data']))
+        except:
+            local_cache.clear()
+            time.sleep(1)
+
+
+def start_cache_invalidation_subscriber():
+    """
+    Start subscriber thread of cache invalidation channel once per process
+    Thread is started lazily since it does not survive forking of uWSGI workers
+    """
+    if subscriber['pid'] == os.getpid():
+        return
+
+    with subscriber['lock']:
+        if subscriber['pid'] == os.getpid():
+            return
+        
+        local_cache.clear()
+        thread = threading.Thread(target=listen_cache_invalidation)
+        thread.daemon = True
+        thread.start()
+        subscriber['pid'] = os.getpid()
+
+
+def invalidate_local_cache(survey_obj):
+    """
+    Tell every process to drop local cache entries of survey
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    local_cache.invalidate(survey_obj.id)
+    get_redis_connection('default').publish(getattr(settings, 'CACHE_INVALIDATION_CHANNEL'), survey_obj.id)
+
+
+def get_shared_matrix_path(survey_id, key_suffix, name, version):
+    """
+    Get path of memory-mapped matrix file of cache value, which is named after its version
+    """
+    return os.path.join(getattr(settings, 'SHARED_MATRIX_DIR'), 
+            'survey' + str(survey_id) + key_suffix.replace(':', '-') + '-' + name + '-' + version + '.npy')
+
+
+def export_shared_matrix(path, matrix):
+    """
+    Write matrix to `.npy` file atomically, so readers never open half-written file
+    """
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError:
+        pass
+
+    temporary_path = path + '.' + uuid4().hex + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        numpy.save(f, matrix)
+    os.rename(temporary_path, path)
+
+
+def remove_previous_shared_matrices(path):
+    """
+    Remove files of other versions of matrix which are older than file of current version
+    Processes which mapped them keep reading until they reload, and process which fails to load them exports again
+    """
+    directory, filename = os.path.split(path)
+    prefix = filename.rsplit('-', 1)[0] + '-'
+    try:
+        current_modified_at = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    for other_filename in os.listdir(directory):
+        if other_filename.startswith(prefix) and other_filename.endswith('.npy') and other_filename != filename:
+            try:
+                if os.path.getmtime(os.path.join(directory, other_filename)) < current_modified_at:
+                    os.remove(os.path.join(directory, other_filename))
+            except OSError:
+                pass
+
+
+def share_matrices(survey_id, builder, cache_value):
+    """
+    Replace matrices of cache value with read-only memory maps of `.npy` files under `SHARED_MATRIX_DIR`
+    Every process on a node maps same file, so only one physical copy of each version is kept
+    Raw buffer is shared as uint8 array which is viewed as its own type by readers
+    Matrix which can not be mapped is left as value from Redis
+    """
+    cache_value = dict(cache_value)
+    key = 'survey:' + str(survey_id) + builder.key_suffix
+    is_current_version = cache.get(key + ':version') == cache_value['version']
+
+    for name in builder.shared_matrices:
+        # Empty file can not be mapped
+        if len(cache_value[name]) == 0:
+            continue
+        
+        shared_matrix = shared_matrices.get((survey_id, builder.key_suffix, name))
+        if shared_matrix is None or shared_matrix[0] != cache_value['version']:
+            path = get_shared_matrix_path(survey_id, builder.key_suffix, name, cache_value['version'])
+            # File could be removed by another process at any time, so it is loaded without checking its existence
+            try:
+                shared_matrix = (cache_value['version'], numpy.load(path, mmap_mode='r'))
+            except (IOError, OSError):
+                matrix = cache_value[name]
+                if isinstance(matrix, bytes):
+                    matrix = numpy.frombuffer(matrix, dtype=numpy.uint8)
+                try:
+                    export_shared_matrix(path, matrix)
+                    shared_matrix = (cache_value['version'], numpy.load(path, mmap_mode='r'))
+                except (IOError, OSError):
+                    continue
+            
+            # Process holding stale version never removes files, so file of current version is kept
+            if is_current_version == True:
+                remove_previous_shared_matrices(path)
+            shared_matrices[(survey_id, builder.key_suffix, name)] = shared_matrix
+        cache_value[name] = shared_matrix[1]
+
+    return cache_value
+
+
+class CacheBuildTimeout(Exception):
+    """
+    Raised when cache is missing and the process rebuilding it does not finish in time
+    """
+    pass
+
+
+def single_flight(key_suffix, dependents=(), shared_matrices=()):
+    """
+    Decorator for cache builder of survey which allows only one process to rebuild the cache at once
+    Builder waits for the lock by default (at most `blocking_timeout` seconds if given),
+    or returns None without rebuilding if `blocking` is False or the lock is not acquired in time
+    When `newer_than` is given, valid value built after that time by the previous holder of the lock is returned
+    instead of rebuilding again
+    Duration of rebuilding and expiry are saved at `<key>:meta` for probabilistic early refresh
+    Caches derived from the cache are listed as `dependents` and deleted after rebuilding
+    Matrices of versioned cache value listed as `shared_matrices` are memory-mapped by `get_cache` if `USE_SHARED_MATRICES`
+    """
+    def decorator(builder):
+        @wraps(builder)
+        def wrapper(survey_obj, blocking=True, blocking_timeout=None, is_valid=None, newer_than=None):
+            if isinstance(survey_obj, Survey) == False:
+                raise ValueError('Invalid variable')
+            
+            key = 'survey:' + str(survey_obj.id) + key_suffix
+            lock = cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_BUILD_LOCK_TIMEOUT'))
+            if lock.acquire(blocking=blocking, blocking_timeout=blocking_timeout) == False:
+                return None
+            
+            try:
+                # Previous holder of the lock could have built the value while waiting
+                if newer_than is not None:
+                    cache_values = cache.get_many([key, key + ':meta'])
+                    cache_value = cache_values.get(key)
+                    meta = cache_values.get(key + ':meta')
+                    if cache_value is not None and meta is not None and meta.get('built_at', 0) > newer_than and \
+                            (is_valid is None or is_valid(cache_value)):
+                        return cache_value
+                
+                started_at = time.time()
+                cache_value = builder(survey_obj)
+                finished_at = time.time()
+                cache.set(key + ':meta', 
+                        {'delta': finished_at - started_at, 
+                            'expiry': finished_at + getattr(settings, 'CACHE_TTL'), 
+                            'built_at': finished_at}, 
+                        timeout=getattr(settings, 'CACHE_TTL'))
+                cache.delete_many(['survey:' + str(survey_obj.id) + dependent for dependent in dependents])
+                invalidate_local_cache(survey_obj)
+            finally:
+                # Lock could be expired already when rebuilding takes too long
+                try:
+                    lock.release()
+                except:
+                    pass
+            
+            return cache_value
+        
+        wrapper.key_suffix = key_suffix
+        wrapper.shared_matrices = shared_matrices
+        return wrapper
+    return decorator
+
+
+def get_cache(survey_obj, builder, is_valid=None):
+    """
+    Get cache of survey built by single-flight builder
+    Value is read from local cache of process first, and then from Redis
+    Cached value is shared by requests, so DO NOT modify it
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    if getattr(settings, 'USE_LOCAL_CACHE') == False:
+        return get_shared_cache(survey_obj, builder, is_valid)
+
+    start_cache_invalidation_subscriber()
+
+    key = 'survey:' + str(survey_obj.id) + builder.key_suffix
+    cache_value = local_cache.get(key, survey_obj.id)
+    if cache_value is not None and (is_valid is None or is_valid(cache_value)):
+        return cache_value
+
+    stamp = local_cache.get_stamp(survey_obj.id)
+    cache_value = get_shared_cache(survey_obj, builder, is_valid)
+    if getattr(settings, 'USE_SHARED_MATRICES') == True and len(builder.shared_matrices) > 0:
+        cache_value = share_matrices(survey_obj.id, builder, cache_value)
+    local_cache.set(key, survey_obj.id, cache_value, stamp)
+    return cache_value
+
+
+def get_shared_cache(survey_obj, builder, is_valid=None):
+    """
+    Get cache of survey in Redis built by single-flight builder
+    (1) Valid cache is refreshed before expiry with probability which grows as expiry approaches (XFetch)
+        Previous value is returned if another process is already refreshing it
+    (2) Missing or invalid cache is rebuilt by only one process while others wait briefly for the new value
+        Waiting process rebuilds by itself only if it gets the lock without a newer value in time,
+        otherwise `CacheBuildTimeout` is raised instead of queueing behind slow rebuilding
+    """
+    key = 'survey:' + str(survey_obj.id) + builder.key_suffix
+    cache_values = cache.get_many([key, key + ':meta'])
+    cache_value = cache_values.get(key)
+    meta = cache_values.get(key + ':meta')
+
+    if cache_value is not None and (is_valid is None or is_valid(cache_value)):
+        if meta is None or time.time() - meta['delta'] * getattr(settings, 'CACHE_EARLY_REFRESH_BETA') * \
+                math.log(1 - random.random()) < meta['expiry']:
+            return cache_value
+        
+        new_cache_value = builder(survey_obj, blocking=False)
+        return cache_value if new_cache_value is None else new_cache_value
+
+    waited_at = time.time()
+    new_cache_value = builder(survey_obj, blocking=False)
+    if new_cache_value is not None:
+        return new_cache_value
+
+    deadline = time.time() + getattr(settings, 'CACHE_BUILD_WAIT')
+    while time.time() < deadline:
+        time.sleep(0.05)
+        cache_value = cache.get(key)
+        if cache_value is not None and (is_valid is None or is_valid(cache_value)):
+            return cache_value
+
+    # Rebuild by itself only if the other process gave up the lock without leaving a newer value
+    new_cache_value = builder(survey_obj, blocking_timeout=getattr(settings, 'CACHE_BUILD_WAIT'), 
+            is_valid=is_valid, newer_than=waited_at)
+    if new_cache_value is None:
+        raise CacheBuildTimeout(key)
+    return new_cache_value
+
+
+@single_flight(':comparison_targets:list', dependents=(':comparison_targets:list:response', ))
 def set_comparison_target_list_cache(survey_obj):
     """
     Set comparison target list cache
@@ -21,9 +354,31 @@ def set_comparison_target_list_cache(survey_obj):
     serializer = ComparisonTargetSerializer(comparison_targets, many=True)
     cache_value = serializer.data
     cache.set('survey:' + str(survey_obj.id) + ':comparison_targets:list', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+    utilities.update_cache_version('survey:' + str(survey_obj.id) + ':comparison_targets:list', 
+            max([comparison_target.updated_at for comparison_target in comparison_targets] or [None]))
     return cache_value
 
 
+@single_flight(':comparison_targets:list:response')
+def set_comparison_target_list_response_cache(survey_obj):
+    """
+    Set rendered JSON and gzip compressed response of comparison target list cache
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    version = utilities.get_cache_version('survey:' + str(survey_obj.id) + ':comparison_targets:list')
+    comparison_targets = get_cache(survey_obj, set_comparison_target_list_cache)
+    cache_value = utilities.render_response(comparison_targets, version)
+    cache.set('survey:' + str(survey_obj.id) + ':comparison_targets:list:response', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+
+    # Drop response rendered with stale data when source is rebuilt meanwhile
+    if utilities.get_cache_version('survey:' + str(survey_obj.id) + ':comparison_targets:list') != version:
+        cache.delete('survey:' + str(survey_obj.id) + ':comparison_targets:list:response')
+    return cache_value
+
+
+@single_flight(':comparison_targets:data', shared_matrices=('matrix', ))
 def set_survey_data_of_comparison_targets_cache(survey_obj):
     """
     Set survey data of comparison targets cache
@@ -32,25 +387,39 @@ def set_survey_data_of_comparison_targets_cache(survey_obj):
         raise ValueError('Invalid variable')
 
     comparison_targets = ComparisonTarget.objects.select_related('user').filter(survey=survey_obj, user__in=survey_obj.participants.all())
+    users_id_list = [comparison_target.user_id for comparison_target in comparison_targets]
+
+    # Load answers of all comparison targets at once
+    factor_matrix, users_id_array = utilities.get_factor_matrix_of_users(survey_obj, users_id_list)
+    rows_index = dict((user_id, index) for index, user_id in enumerate(users_id_array.tolist()))
+    updated_at_of_users = utilities.get_updated_at_of_users(survey_obj, users_id_list)
 
     comparison_targets_data = []
     comparison_targets_updated_at = []
 
+    # Factor matrix of comparison targets in same order as data
+    target_matrix = factor_matrix[[rows_index[user_id] for user_id in users_id_list]].reshape(-1, factor_matrix.shape[1])
+
     for comparison_target in comparison_targets:
-        raw_data = utilities.get_survey_data_of_user(comparison_target.user, survey_obj)
+        factors = factor_matrix[rows_index[comparison_target.user_id]]
         comparison_target_data = {'name': comparison_target.name, 
                 'economic_score': comparison_target.user.economic_score,
                 'color': comparison_target.color, 
                 'is_reliable': comparison_target.is_reliable,
-                'factor_list': raw_data['factor_list']}
+                'factor_list': factors[factors != utilities.UNANSWERED_FACTOR].tolist()}
         comparison_targets_data.append(comparison_target_data)
-        comparison_targets_updated_at.append(raw_data['updated_at'])
+        comparison_targets_updated_at.append(updated_at_of_users.get(comparison_target.user_id, timezone.now()))
 
-    cache_value = {'data': comparison_targets_data, 'updated_at': comparison_targets_updated_at}
+    cache_value = {'data': comparison_targets_data, 
+            'updated_at': comparison_targets_updated_at,
+            'matrix': target_matrix,
+            'valid_answers_count': utilities.get_valid_answers_count(target_matrix),
+            'version': utilities.update_cache_version('survey:' + str(survey_obj.id) + ':comparison_targets:data')}
     cache.set('survey:' + str(survey_obj.id) + ':comparison_targets:data', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
     return cache_value
 
 
+@single_flight(':comparison_targets:records')
 def set_records_of_comparison_targets_cache(survey_obj):
     """
     Set records of comparison targets cache
@@ -71,9 +440,11 @@ def set_records_of_comparison_targets_cache(survey_obj):
         cache_value.append({'name': comparison_target.name, 'color': comparison_target.color, 'records': choice_list})
 
     cache.set('survey:' + str(survey_obj.id) + ':comparison_targets:records', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+    utilities.update_cache_version('survey:' + str(survey_obj.id) + ':comparison_targets:records')
     return cache_value
 
 
+@single_flight(':questions', dependents=(':questions:response', ':questions:unawareness'))
 def set_questions_cache(survey_obj):
     """
     Set questions cache
@@ -85,9 +456,64 @@ def set_questions_cache(survey_obj):
     serializer = QuestionSerializer(questions, many=True)
     cache_value = serializer.data
     cache.set('survey:' + str(survey_obj.id) + ':questions', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+    utilities.update_cache_version('survey:' + str(survey_obj.id) + ':questions', 
+            utilities.get_last_modified_of_questions(questions))
+    return cache_value
+
+
+@single_flight(':questions:response')
+def set_questions_response_cache(survey_obj):
+    """
+    Set rendered JSON and gzip compressed response of questions cache
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    version = utilities.get_cache_version('survey:' + str(survey_obj.id) + ':questions')
+    questions = get_cache(survey_obj, set_questions_cache)
+    cache_value = utilities.render_response(questions, version)
+    cache.set('survey:' + str(survey_obj.id) + ':questions:response', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+
+    # Drop response rendered with stale data when source is rebuilt meanwhile
+    if utilities.get_cache_version('survey:' + str(survey_obj.id) + ':questions') != version:
+        cache.delete('survey:' + str(survey_obj.id) + ':questions:response')
+    return cache_value
+
+
+@single_flight(':questions:unawareness')
+def set_unawareness_choices_cache(survey_obj):
+    """
+    Set 'unawareness'(=7) choice of each question cache which is chosen for unanswered questions
+    Question without 'unawareness' choice has None
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    version = utilities.get_cache_version('survey:' + str(survey_obj.id) + ':questions')
+    questions = utilities.get_questions_of_survey(survey_obj)
+    cache_value = {'version': version, 
+            'choices': utilities.get_unawareness_choices_of_questions(questions)}
+    cache.set('survey:' + str(survey_obj.id) + ':questions:unawareness', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
     return cache_value
 
 
+@single_flight(':questions:category')
+def set_questions_category_cache(survey_obj):
+    """
+    Set categories and category mask of questions cache
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    version = utilities.get_cache_version('survey:' + str(survey_obj.id) + ':questions')
+    questions = utilities.get_questions_of_survey(survey_obj)
+    cache_value = utilities.get_questions_category_mask([question['subtitle'] for question in questions])
+    cache_value['version'] = version
+    cache.set('survey:' + str(survey_obj.id) + ':questions:category', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+    return cache_value
+
+
+@single_flight(':questions:count')
 def set_questions_count_cache(survey_obj):
     """
     Set questions count cache
@@ -100,6 +526,7 @@ def set_questions_count_cache(survey_obj):
     return cache_value
 
 
+@single_flight(':rotation_matrix', shared_matrices=('matrix_data', ))
 def set_rotation_matrix_cache(survey_obj):
     """
     Set rotation matrix cache
@@ -108,9 +535,42 @@ def set_rotation_matrix_cache(survey_obj):
         raise ValueError('Invalid variable')
 
     rotation_matrix = RotationMatrix.objects.filter(survey=survey_obj, is_deployed=True).latest('id')
-    cache_value = {'matrix': numpy.array(literal_eval(rotation_matrix.matrix)), 
+    
+    # Matrix is cached as raw buffer which is viewed with `utilities.unpack_rotation_matrix` instead of unpickling array
+    packed_matrix = utilities.pack_rotation_matrix(utilities.get_matrix_of_rotation_matrix(rotation_matrix))
+    cache_value = {'id': rotation_matrix.id,
+            'version': utilities.update_cache_version('survey:' + str(survey_obj.id) + ':rotation_matrix'),
+            'matrix_data': packed_matrix['matrix_data'], 
+            'matrix_rows': packed_matrix['matrix_rows'], 
+            'matrix_columns': packed_matrix['matrix_columns'], 
             'x_axis_name': rotation_matrix.x_axis_name,
             'y_axis_name': rotation_matrix.y_axis_name,
             'updated_at': rotation_matrix.updated_at}
     cache.set('survey:' + str(survey_obj.id) + ':rotation_matrix', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
     return cache_value
+
+
+def set_pca_coordinates_of_comparison_targets_cache(survey_obj):
+    """
+    Set PCA coordinates of comparison targets cache for deployed rotation matrix
+    Coordinates are recalculated only if rotation matrix or answers of comparison targets are changed
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    rotation_matrix = get_cache(survey_obj, set_rotation_matrix_cache, lambda x: 'version' in x)
+    comparison_targets = get_cache(survey_obj, set_survey_data_of_comparison_targets_cache, lambda x: 'version' in x)
+
+    # Unanswered question is not a factor, so comparison target who did not answer all questions can not be projected
+    unanswered_rows = (comparison_targets['matrix'] == utilities.UNANSWERED_FACTOR).any(axis=1)
+    if unanswered_rows.any():
+        raise ValueError([comparison_targets['data'][index]['name'] for index in unanswered_rows.nonzero()[0]])
+
+    cache_value = {'version': comparison_targets['version'],
+            'rotation_matrix_version': rotation_matrix['version'],
+            'coordinates': utilities.get_pca_coordinates(comparison_targets['matrix'], 
+                utilities.unpack_rotation_matrix(rotation_matrix['matrix_data'], 
+                    rotation_matrix['matrix_rows'], rotation_matrix['matrix_columns']))}
+    cache.set('survey:' + str(survey_obj.id) + ':rotation_matrix:' + str(rotation_matrix['id']) + ':comparison_targets:coordinates', 
+            cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+    return cache_value
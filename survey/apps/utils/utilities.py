@@ -2,16 +2,30 @@
 # -*- coding:utf-8 -*-
 
 import base64
+import calendar
 import cloudinary
 import cloudinary.uploader
+import hashlib
 import json
-import math
 import numpy
+import os
+import random
+import shutil
+import zlib
+from ast import literal_eval
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Value, When
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from django.utils import timezone
-from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, VoiceOfCustomer
+from django_redis import get_redis_connection
+from main.models import User, ComparisonTarget, Survey, Question, Choice, Answer, Result, RotationMatrix, CovarianceAccumulator, VoiceOfCustomer
 from main.serializers import QuestionSerializer
+from rest_framework.renderers import JSONRenderer
+from uuid import uuid4
 
 # Cloudinary configuration
 cloudinary.config( 
@@ -21,21 +35,129 @@ cloudinary.config(
 )
 
 
-def get_survey_data_of_user(user_obj, survey_obj):
+# Factor of unanswered question in factor vector
+UNANSWERED_FACTOR = -128
+
+
+def get_cache_version(key):
     """
-    Get factor list and last updated datetime of user's survey data from all answers
+    Get version of cached value which changes whenever the value is rebuilt
     """
-    if isinstance(user_obj, User) == False:
-        raise ValueError('Invalid variable')
+    version = cache.get(key + ':version')
+    if version is None:
+        cache.add(key + ':version', uuid4().hex, timeout=getattr(settings, 'CACHE_TTL'))
+        version = cache.get(key + ':version')
+
+    return version
+
+
+def update_cache_version(key, last_modified=None):
+    """
+    Update version of cached value
+    Last modified datetime of source objects is saved together if given
+    """
+    version = uuid4().hex
+    if last_modified is None:
+        cache.set(key + ':version', version, timeout=getattr(settings, 'CACHE_TTL'))
+    else:
+        cache.set_many({key + ':version': version, key + ':last_modified': last_modified}, 
+                timeout=getattr(settings, 'CACHE_TTL'))
+    return version
+
+
+def get_last_modified_of_questions(questions):
+    """
+    Get last modified datetime of questions including their choices
+    Choices should be prefetched
+    """
+    last_modified = None
+    for question in questions:
+        for obj in [question] + list(question.choices.all()):
+            if last_modified is None or obj.updated_at > last_modified:
+                last_modified = obj.updated_at
+
+    return last_modified
+
+
+def get_cache_validators(key):
+    """
+    Get version and last modified datetime of cached value without building it
+    """
+    cache_values = cache.get_many([key + ':version', key + ':last_modified'])
+
+    return cache_values.get(key + ':version'), cache_values.get(key + ':last_modified')
 
+
+def accepts_gzip(request):
+    """
+    Check whether client accepts gzip compressed response
+    """
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def get_not_modified_response(request, etag, last_modified=None):
+    """
+    Get `304 Not Modified` response if client already has the representation, otherwise None
+    `If-None-Match` takes precedence over `If-Modified-Since`
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        not_modified = etag is not None and (etag in etags or '*' in etags)
+    elif if_modified_since is not None and last_modified is not None:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        not_modified = if_modified_since is not None and calendar.timegm(last_modified.utctimetuple()) <= if_modified_since
+    else:
+        not_modified = False
+
+    if not_modified == False:
+        return None
+
+    return set_validators(HttpResponseNotModified(), etag, last_modified)
+
+
+def get_records_etag(user_obj, survey_id):
+    """
+    Get ETag of records of comparison targets, which includes answers of user if authenticated
+    Returns None if cached data to identify them is not exist
+    """
+    if survey_id is None:
+        return None
+
+    version = cache.get('survey:' + str(survey_id) + ':comparison_targets:records:version')
+    if version is None or user_obj.is_authenticated() == False:
+        return version
+
+    # Factor vector is updated whenever user answers
+    factor_vector = cache.get(get_factor_vector_key(user_obj.id, survey_id))
+    if factor_vector is None:
+        return None
+
+    return version + '-' + hashlib.md5(str(user_obj.id) + ':' + factor_vector['updated_at'].isoformat()).hexdigest()
+
+
+def set_validators(response, etag, last_modified=None):
+    """
+    Set `ETag` and `Last-Modified` headers of response
+    """
+    if etag is not None:
+        response['ETag'] = quote_etag(etag)
+
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(calendar.timegm(last_modified.utctimetuple()))
+
+    return response
+
+
+def get_questions_of_survey(survey_obj):
+    """
+    Get cached questions of survey
+    """
     if isinstance(survey_obj, Survey) == False:
         raise ValueError('Invalid variable')
 
-    answers = Answer.objects.select_related('choice').\
-        filter(user=user_obj, choice__question__survey=survey_obj).order_by('choice__question_id')
-    factor_list = []
-    updated_at_list = []
-
     # Avoid circular import
     questions = cache.get('survey:' + str(survey_obj.id) + ':questions')
     if questions == None:
@@ -43,25 +165,1013 @@ def get_survey_data_of_user(user_obj, survey_obj):
         serializer = QuestionSerializer(questions, many=True)
         cache_value = serializer.data
         cache.set('survey:' + str(survey_obj.id) + ':questions', cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+        update_cache_version('survey:' + str(survey_obj.id) + ':questions', get_last_modified_of_questions(questions))
+        cache.delete_many(['survey:' + str(survey_obj.id) + ':questions:response', 
+            'survey:' + str(survey_obj.id) + ':questions:unawareness'])
         questions = cache_value
-    
-    if answers.exists() == False:
-        return {'economic_score': 0, 'factor_list': [], 'updated_at': timezone.now()}
 
-    for answer, question in zip(answers, questions):
-        factor = answer.choice.factor
-        if 'factor_reversed' in question and question['factor_reversed'] == True and factor != 7:
-            factor_list.append(factor * -1)
+    return questions
+
+
+def get_factor_vector_key(user_id, survey_id):
+    """
+    Get cache key of factor vector of user in specific survey
+    """
+    return 'survey:' + str(survey_id) + ':user:' + str(user_id) + ':factor_vector'
+
+
+def get_factor_vector(user_obj, survey_obj):
+    """
+    Get cached factor vector of user's survey data
+    Factors are packed as int8 in order of questions and unanswered question has `UNANSWERED_FACTOR`
+    Buffered answers which are not flushed to DB yet take precedence over answers in DB
+    For example,
+        {
+            'version': version of questions,
+            'factors': numpy.array([1, -3, 7, -128], dtype=numpy.int8),
+            'economic_score': 5,
+            'updated_at': datetime
+        }
+    """
+    if isinstance(user_obj, User) == False:
+        raise ValueError('Invalid variable')
+
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    key = get_factor_vector_key(user_obj.id, survey_obj.id)
+    version = get_cache_version('survey:' + str(survey_obj.id) + ':questions')
+    cache_value = cache.get(key)
+
+    if cache_value is None or cache_value['version'] != version:
+        # Lock prevents stale vector from being cached while answers are changing
+        with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+            answers = Answer.objects.select_related('choice').filter(user=user_obj, choice__question__survey=survey_obj)
+            questions = get_questions_of_survey(survey_obj)
+            economic_score = user_obj.economic_score
+            
+            # Factor and updated datetime of each answered question
+            answered = {}
+            for answer in answers:
+                answered[answer.choice.question_id] = (answer.choice.factor, answer.updated_at)
+            
+            answer_buffer = get_answer_buffer(user_obj.id, survey_obj.id)
+            if answer_buffer is not None:
+                choices = get_choices_of_questions(questions)
+                for question_id, choice_id in answer_buffer['answers'].iteritems():
+                    if choice_id not in choices:
+                        continue
+                    choice = choices[choice_id]
+                    old_factor = answered[question_id][0] if question_id in answered else None
+                    economic_score += get_economic_score_delta(choice['question'], old_factor, choice['factor'])
+                    answered[question_id] = (choice['factor'], answer_buffer['updated_at'])
+            
+            factors = numpy.empty(len(questions), dtype=numpy.int8)
+            factors.fill(UNANSWERED_FACTOR)
+            for index, question in enumerate(questions):
+                if question['id'] in answered:
+                    factors[index] = get_factor_of_question(question, answered[question['id']][0])
+            
+            if len(answered) == 0:
+                economic_score = 0
+                updated_at = timezone.now()
+            else:
+                updated_at = max(x[1] for x in answered.values())
+            
+            cache_value = {'version': version,
+                    'factors': factors.tobytes(),
+                    'economic_score': economic_score,
+                    'updated_at': updated_at}
+            cache.set(key, cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+
+    return {'version': cache_value['version'],
+            'factors': numpy.frombuffer(cache_value['factors'], dtype=numpy.int8),
+            'economic_score': cache_value['economic_score'],
+            'updated_at': cache_value['updated_at']}
+
+
+def update_factor_vector(user_id, survey_id, choice_list, update_economic_score=True):
+    """
+    Update cached factor vector of user in place with chosen choices
+    Choice list consists of choices from `get_choices_of_questions`
+    Vector will be rebuilt later if it is not cached or questions are changed
+    """
+    key = get_factor_vector_key(user_id, survey_id)
+    version = get_cache_version('survey:' + str(survey_id) + ':questions')
+
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        cache_value = cache.get(key)
+        if cache_value is None:
+            # Previous factors of participant are unknown, so covariance accumulator can not be updated
+            if get_participation(user_id, survey_id) == True:
+                invalidate_covariance_accumulator(survey_id)
+            return None
+        
+        if cache_value['version'] != version:
+            cache.delete(key)
+            return None
+        
+        old_factors = numpy.frombuffer(cache_value['factors'], dtype=numpy.int8)
+        factors = old_factors.copy()
+        for choice in choice_list:
+            question = choice['question']
+            old_factor = factors[choice['index']]
+            if old_factor == UNANSWERED_FACTOR:
+                old_factor = None
+            else:
+                old_factor = get_factor_of_question(question, int(old_factor))
+            
+            factors[choice['index']] = get_factor_of_question(question, choice['factor'])
+            if update_economic_score == True:
+                cache_value['economic_score'] += get_economic_score_delta(question, old_factor, choice['factor'])
+        
+        cache_value['factors'] = factors.tobytes()
+        cache_value['updated_at'] = timezone.now()
+        cache.set(key, cache_value, timeout=getattr(settings, 'CACHE_TTL'))
+        
+        # Answers of participant are counted in covariance of factors
+        if numpy.array_equal(old_factors, factors) == False and get_participation(user_id, survey_id) == True:
+            update_covariance_accumulator(survey_id, version, [old_factors], [factors])
+
+    return cache_value
+
+
+def get_factor_of_question(question, factor):
+    """
+    Get factor considering whether factor of question is reversed
+    Factor of 'unawareness'(=7) is never reversed
+    """
+    if 'factor_reversed' in question and question['factor_reversed'] == True and factor != 7:
+        return factor * -1
+    else:
+        return factor
+
+
+def get_survey_data_of_user(user_obj, survey_obj):
+    """
+    Get factor list and last updated datetime of user's survey data from cached factor vector
+    Factor vector itself and its version are also included to identify answers of user
+    """
+    factor_vector = get_factor_vector(user_obj, survey_obj)
+    factors = factor_vector['factors']
+    factor_list = factors[factors != UNANSWERED_FACTOR].tolist()
+
+    return {'economic_score': factor_vector['economic_score'],
+            'factor_list': factor_list,
+            'factors': factors,
+            'version': factor_vector['version'],
+            'updated_at': factor_vector['updated_at']}
+
+
+def get_factor_matrix_of_users(survey_obj, users_id_list):
+    """
+    Get factor matrix of many users in specific survey by streaming answers chunk by chunk
+    Rows are in ascending order of user ID and columns are in order of questions
+    Unanswered question has `UNANSWERED_FACTOR` and buffered answers which are not flushed to DB yet are not included
+    For example,
+    [Input]
+        users_id_list = [3, 1]
+    [Output]
+        (
+            array([[ 1, -3,    7],
+                [ 2,  0, -128]], dtype=int8),
+            
+            array([1, 3])
+        )
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    questions = get_questions_of_survey(survey_obj)
+    questions_index = dict((question['id'], index) for index, question in enumerate(questions))
+    factor_reversed = numpy.array([question['factor_reversed'] == True for question in questions], dtype=bool)
+    chunk_size = getattr(settings, 'FACTOR_MATRIX_CHUNK_SIZE')
+
+    users_id_array = numpy.unique(numpy.array(list(users_id_list), dtype=numpy.int64))
+    factor_matrix = numpy.empty((len(users_id_array), len(questions)), dtype=numpy.int8)
+    factor_matrix.fill(UNANSWERED_FACTOR)
+
+    for start in range(0, len(users_id_array), chunk_size):
+        chunk = users_id_array[start:start + chunk_size]
+        rows = Answer.objects.filter(user_id__in=chunk.tolist(), choice__question__survey=survey_obj).\
+            order_by('user_id', 'choice__question_id').\
+            values_list('user_id', 'choice__question_id', 'choice__factor').iterator()
+        
+        # Rows are ordered by user ID, so row index only moves forward
+        row_index = start
+        for user_id, question_id, factor in rows:
+            while users_id_array[row_index] != user_id:
+                row_index += 1
+            factor_matrix[row_index, questions_index[question_id]] = factor
+        
+        # Reverse factors of reversed questions except 'unawareness'(=7)
+        chunk_matrix = factor_matrix[start:start + chunk_size]
+        reversed_mask = factor_reversed & (chunk_matrix != 7) & (chunk_matrix != UNANSWERED_FACTOR)
+        chunk_matrix[reversed_mask] = -chunk_matrix[reversed_mask]
+
+    return factor_matrix, users_id_array
+
+
+def get_updated_at_of_users(survey_obj, users_id_list):
+    """
+    Get last updated datetime of answers of many users in specific survey at once
+    Return dictionary whose key is user ID
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    rows = Answer.objects.filter(user_id__in=list(users_id_list), choice__question__survey=survey_obj).\
+        order_by().values('user_id').annotate(updated_at=Max('updated_at')).values_list('user_id', 'updated_at')
+
+    return dict(rows)
+
+
+def get_choices_of_questions(questions):
+    """
+    Get choices of cached questions as dictionary whose key is choice ID
+    Index is order of question which is same as position in factor vector
+    For example,
+    [Input]
+        questions = [{
+            'id': 1,
+            'is_economic_bill': True,
+            'factor_reversed': False,
+            'choices': [{'id': 1, 'question': 1, 'factor': -3}, {'id': 2, 'question': 1, 'factor': 7}]
+            ...
+        }]
+    [Output]
+        {
+            1: {'id': 1, 'factor': -3, 'index': 0, 'question': {'id': 1, 'is_economic_bill': True, ...}},
+            2: {'id': 2, 'factor': 7, 'index': 0, 'question': {'id': 1, 'is_economic_bill': True, ...}}
+        }
+    """
+    choices = {}
+
+    for index, question in enumerate(questions):
+        for choice in question['choices']:
+            choices[choice['id']] = {'id': choice['id'], 'factor': choice['factor'], 'index': index, 'question': question}
+
+    return choices
+
+
+def get_unawareness_choices_of_questions(questions):
+    """
+    Get 'unawareness'(=7) choice of each cached question
+    [Input]
+        questions = [{
+            'id': 1,
+            'choices': [{'id': 1, 'question': 1, 'factor': -3}, {'id': 2, 'question': 1, 'factor': 7}]
+            ...
+        }, 
+        {
+            'id': 2,
+            'choices': [{'id': 3, 'question': 2, 'factor': -3}, {'id': 4, 'question': 2, 'factor': 3}]
+            ...
+        }]
+    [Output]
+        {1: 2, 2: None}
+    """
+    unawareness_choices = {}
+
+    for question in questions:
+        unawareness_choices[question['id']] = None
+        for choice in question['choices']:
+            if choice['factor'] == 7:
+                unawareness_choices[question['id']] = choice['id']
+                break
+
+    return unawareness_choices
+
+
+def get_economic_score_delta(question, old_factor, new_factor):
+    """
+    Get delta of user's economic score when answer of question changes from old factor to new factor
+    Old factor is None if user did not answer the question yet
+    """
+    if question['is_economic_bill'] == False:
+        return 0
+
+    if old_factor is None:
+        old_factor = 0
+
+    if question['factor_reversed'] == True:
+        return old_factor - new_factor
+    else:
+        return new_factor - old_factor
+
+
+def save_answers(user_obj, survey_obj, choice_list):
+    """
+    Create or update answers of user in bulk and apply summed economic score delta at once
+    Choice list consists of choices from `get_choices_of_questions` (at most one choice per question)
+    Return count of created answers and updated answers
+    """
+    if isinstance(user_obj, User) == False:
+        raise ValueError('Invalid variable')
+
+    created_count, updated_count, economic_score_deltas = \
+        save_answers_of_users(survey_obj, {user_obj.id: choice_list})
+    user_obj.economic_score += economic_score_deltas.get(user_obj.id, 0)
+    update_factor_vector(user_obj.id, survey_obj.id, choice_list)
+
+    return created_count, updated_count
+
+
+def save_answers_of_users(survey_obj, choice_lists):
+    """
+    Create or update answers of users in bulk and apply economic score deltas at once
+    Choice lists is dictionary whose key is user ID and value is list of choices from `get_choices_of_questions`
+    Answers are compared with existing answers in DB, so saving same choices again changes nothing
+    Return count of created answers, count of updated answers and economic score delta of each user
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    answers = Answer.objects.select_related('choice').\
+        filter(user_id__in=choice_lists.keys(), choice__question__survey=survey_obj)
+    answers_of_question = {}
+    for answer in answers:
+        answers_of_question[(answer.user_id, answer.choice.question_id)] = answer
+
+    new_answers = []
+    updated_answers_id_list = []
+    updated_choices = []
+    economic_score_deltas = {}
+    choice_deltas = {}
+
+    for user_id, choice_list in choice_lists.iteritems():
+        economic_score_delta = 0
+        
+        for choice in choice_list:
+            question = choice['question']
+            answer = answers_of_question.get((user_id, question['id']))
+            
+            if answer is None:
+                new_answers.append(Answer(user_id=user_id, choice_id=choice['id']))
+                economic_score_delta += get_economic_score_delta(question, None, choice['factor'])
+                choice_deltas[choice['id']] = choice_deltas.get(choice['id'], 0) + 1
+            elif answer.choice_id != choice['id']:
+                updated_answers_id_list.append(answer.id)
+                updated_choices.append(When(id=answer.id, then=Value(choice['id'])))
+                economic_score_delta += get_economic_score_delta(question, answer.choice.factor, choice['factor'])
+                choice_deltas[answer.choice_id] = choice_deltas.get(answer.choice_id, 0) - 1
+                choice_deltas[choice['id']] = choice_deltas.get(choice['id'], 0) + 1
+        
+        if economic_score_delta != 0:
+            economic_score_deltas[user_id] = economic_score_delta
+
+    with transaction.atomic():
+        if len(new_answers) > 0:
+            Answer.objects.bulk_create(new_answers)
+
+        # Note that update() will not call save() method which means it could not update updated_at field automatically
+        if len(updated_choices) > 0:
+            Answer.objects.filter(id__in=updated_answers_id_list).\
+                update(choice=Case(*updated_choices, output_field=IntegerField()), updated_at=timezone.now())
+
+        if len(economic_score_deltas) > 0:
+            User.objects.filter(id__in=economic_score_deltas.keys()).\
+                update(economic_score=Case(
+                    *[When(id=user_id, then=F('economic_score') + Value(delta)) for user_id, delta in economic_score_deltas.iteritems()],
+                    output_field=IntegerField()))
+
+    update_choice_distribution(survey_obj.id, choice_deltas)
+
+    return len(new_answers), len(updated_choices), economic_score_deltas
+
+
+def get_answer_buffer_key(user_id, survey_id):
+    """
+    Get cache key of answer buffer of user in specific survey
+    """
+    return 'survey:' + str(survey_id) + ':answer_buffer:' + str(user_id)
+
+
+def get_answer_buffer(user_id, survey_id):
+    """
+    Get answers of user which are buffered and not flushed to DB yet
+    For example,
+        {
+            'answers': {question_id: choice_id, ...},
+            'updated_at': datetime
+        }
+    """
+    if getattr(settings, 'USE_ANSWER_BUFFER') == False:
+        return None
+
+    return cache.get(get_answer_buffer_key(user_id, survey_id))
+
+
+def buffer_answer(user_id, survey_id, question_id, choice_id):
+    """
+    Buffer answer of user instead of writing it to DB
+    Buffer keeps only latest choice of each question which will be flushed by `flush_answer_buffers`
+    """
+    return buffer_answers(user_id, survey_id, {question_id: choice_id})
+
+
+def buffer_answers(user_id, survey_id, choices_of_questions):
+    """
+    Buffer answers of user at once, where choices of questions is dictionary whose key is question ID and value is choice ID
+    """
+    key = get_answer_buffer_key(user_id, survey_id)
+
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        answer_buffer = cache.get(key)
+        if answer_buffer is None:
+            answer_buffer = {'answers': {}}
+        answer_buffer['answers'].update(choices_of_questions)
+        answer_buffer['updated_at'] = timezone.now()
+        # Buffer should not be expired before flushed
+        cache.set(key, answer_buffer, timeout=None)
+
+    return answer_buffer
+
+
+def flush_answer_buffers(survey_obj, users_id_list):
+    """
+    Flush buffered answers of users in specific survey to DB at once
+    Buffers are compared with answers in DB, so flushing again after crash does not apply same change twice
+    Return count of flushed buffers
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    keys = dict((user_id, get_answer_buffer_key(user_id, survey_obj.id)) for user_id in users_id_list)
+    answer_buffers = cache.get_many(keys.values())
+
+    if len(answer_buffers) == 0:
+        return 0
+
+    choices = get_choices_of_questions(get_questions_of_survey(survey_obj))
+    choice_lists = {}
+    for user_id, key in keys.iteritems():
+        if key in answer_buffers:
+            choice_lists[user_id] = [choices[choice_id] for choice_id in answer_buffers[key]['answers'].values() if choice_id in choices]
+
+    save_answers_of_users(survey_obj, choice_lists)
+
+    # Remove buffer only if user did not answer again while flushing
+    for user_id in choice_lists.keys():
+        key = keys[user_id]
+        with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+            answer_buffer = cache.get(key)
+            if answer_buffer is not None and answer_buffer['updated_at'] == answer_buffers[key]['updated_at']:
+                cache.delete(key)
+
+    return len(choice_lists)
+
+
+def get_participants_key(survey_id):
+    """
+    Get Redis key of participation bitmap of survey
+    Bit at user ID is set if user completed survey, and bit 0 is set once bitmap is fully built
+    """
+    return 'survey:' + str(survey_id) + ':participants'
+
+
+def rebuild_participation_index(survey_obj):
+    """
+    Rebuild participation bitmap of survey from participants table
+    Participants added while rebuilding are applied again after replacing bitmap
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    connection = get_redis_connection('default')
+    key = get_participants_key(survey_obj.id)
+    temporary_key = key + ':' + uuid4().hex
+    participants = Survey.participants.through.objects.filter(survey_id=survey_obj.id)
+    last_id = participants.aggregate(Max('id'))['id__max'] or 0
+
+    pipeline = connection.pipeline(transaction=False)
+    pipeline.setbit(temporary_key, 0, 1)
+    for index, user_id in enumerate(participants.filter(id__lte=last_id).values_list('user_id', flat=True).iterator()):
+        pipeline.setbit(temporary_key, user_id, 1)
+        if index % 10000 == 9999:
+            pipeline.execute()
+    pipeline.rename(temporary_key, key)
+    pipeline.execute()
+
+    for user_id in participants.filter(id__gt=last_id).values_list('user_id', flat=True):
+        connection.setbit(key, user_id, 1)
+
+    return connection.bitcount(key) - 1
+
+
+def set_participation(survey_id, users_id_list, participated):
+    """
+    Set or unset users in participation bitmap of survey
+    """
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    for user_id in users_id_list:
+        pipeline.setbit(get_participants_key(survey_id), user_id, 1 if participated else 0)
+    pipeline.execute()
+
+
+def is_participant(user_obj, survey_obj):
+    """
+    Check whether user completed survey in O(1) with participation bitmap
+    Participants table is queried only while bitmap is not built
+    """
+    if isinstance(user_obj, User) == False:
+        raise ValueError('Invalid variable')
+
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    return get_participation(user_obj.id, survey_obj.id)
+
+
+def get_participation(user_id, survey_id):
+    """
+    Check whether user completed survey by IDs where user and survey objects are not loaded
+    """
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    pipeline.getbit(get_participants_key(survey_id), 0)
+    pipeline.getbit(get_participants_key(survey_id), user_id)
+    is_built, participated = pipeline.execute()
+
+    if is_built == 0:
+        return Survey.participants.through.objects.filter(survey_id=survey_id, user_id=user_id).exists()
+
+    return participated == 1
+
+
+def get_participants_count(survey_obj):
+    """
+    Get count of users who completed survey, or None if participation bitmap is not built
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    connection = get_redis_connection('default')
+    if connection.getbit(get_participants_key(survey_obj.id), 0) == 0:
+        return None
+
+    return connection.bitcount(get_participants_key(survey_obj.id)) - 1
+
+
+def get_covariance_accumulator(survey_obj):
+    """
+    Get running mean and sum of squared deviations of factors of participants who answered all questions
+    Accumulator is rebuilt from whole participants only if it is not built or questions are changed
+    For example,
+        {
+            'count': 2,
+            'mean': array([ 1.5, -1.5,  2.5]),
+            'squared_deviations': array([[ 0.5, -1.5,  3.5], [-1.5,  4.5, -10.5], [ 3.5, -10.5,  24.5]])
+        }
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    version = get_cache_version('survey:' + str(survey_obj.id) + ':questions')
+    try:
+        accumulator = CovarianceAccumulator.objects.get(survey=survey_obj)
+    except CovarianceAccumulator.DoesNotExist:
+        accumulator = None
+
+    if accumulator is None or accumulator.questions_version != version:
+        accumulator = rebuild_covariance_accumulator(survey_obj, version)
+
+    return unpack_covariance_accumulator(accumulator)
+
+
+def unpack_covariance_accumulator(accumulator):
+    """
+    Unpack binary fields of covariance accumulator into float64 arrays
+    """
+    mean = numpy.frombuffer(bytes(accumulator.mean), dtype=numpy.float64).copy()
+
+    return {'count': accumulator.count,
+            'mean': mean,
+            'squared_deviations': numpy.frombuffer(bytes(accumulator.squared_deviations), dtype=numpy.float64).\
+                reshape(len(mean), len(mean)).copy()}
+
+
+def get_covariance_accumulator_key(survey_id):
+    """
+    Get Redis key prefix of lock and journals of covariance accumulator of survey
+    """
+    return 'survey:' + str(survey_id) + ':covariance_accumulator'
+
+
+def rebuild_covariance_accumulator(survey_obj, version):
+    """
+    Rebuild covariance accumulator from factor matrix of whole participants
+    Version is version of questions which is read before factor matrix is built
+    Deltas which arrive while factor matrix is read are journaled and replayed on rebuilt accumulator, so they are not lost
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    connection = get_redis_connection('default')
+    key = get_covariance_accumulator_key(survey_obj.id)
+    journal_key = key + ':journal:' + str(version) + ':' + uuid4().hex
+    timeout = getattr(settings, 'CACHE_BUILD_LOCK_TIMEOUT')
+
+    # Journals expire in case rebuild fails before its journal is replayed
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        pipeline = connection.pipeline(transaction=True)
+        pipeline.sadd(key + ':journals', journal_key)
+        pipeline.expire(key + ':journals', timeout)
+        pipeline.execute()
+
+    completed_users_id_list = survey_obj.participants.values_list('id', flat=True)
+    factor_matrix = get_factor_matrix_of_users(survey_obj, completed_users_id_list)[0]
+
+    # Exclude users who did not answer all questions
+    factor_matrix = factor_matrix[(factor_matrix != UNANSWERED_FACTOR).all(axis=1)].astype(float)
+    if factor_matrix.shape[0] == 0:
+        mean = numpy.zeros(factor_matrix.shape[1])
+    else:
+        mean = numpy.mean(factor_matrix, axis=0)
+    squared_deviations = (factor_matrix - mean).T.dot(factor_matrix - mean)
+    unpacked = {'count': factor_matrix.shape[0], 'mean': mean, 'squared_deviations': squared_deviations}
+
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        retracted_factors_list = []
+        added_factors_list = []
+        for entry in connection.lrange(journal_key, 0, -1):
+            factors = numpy.frombuffer(entry[1:], dtype=numpy.int8)
+            if entry[0] == 'r':
+                retracted_factors_list.append(factors)
+            else:
+                added_factors_list.append(factors)
+        unpacked = apply_covariance_deltas(unpacked, retracted_factors_list, added_factors_list)
+        
+        accumulator, created = CovarianceAccumulator.objects.update_or_create(survey=survey_obj, defaults={
+            'questions_version': version,
+            'count': unpacked['count'],
+            'mean': unpacked['mean'].tobytes(),
+            'squared_deviations': unpacked['squared_deviations'].tobytes()})
+        
+        pipeline = connection.pipeline(transaction=True)
+        pipeline.srem(key + ':journals', journal_key)
+        pipeline.delete(journal_key)
+        pipeline.execute()
+
+    return accumulator
+
+
+def invalidate_covariance_accumulator(survey_id):
+    """
+    Let covariance accumulator be rebuilt from whole participants when it is read next time
+    """
+    CovarianceAccumulator.objects.filter(survey_id=survey_id).update(questions_version='')
+
+
+def apply_covariance_deltas(unpacked, retracted_factors_list, added_factors_list):
+    """
+    Retract and add factors of participants from unpacked covariance accumulator with Welford's method
+    """
+    count = unpacked['count']
+    mean = unpacked['mean']
+    squared_deviations = unpacked['squared_deviations']
+
+    for factors in retracted_factors_list:
+        factors = factors.astype(float)
+        if count <= 1:
+            count = 0
+            mean.fill(0)
+            squared_deviations.fill(0)
+            continue
+        count -= 1
+        retracted_mean = mean - (factors - mean) / count
+        squared_deviations -= numpy.outer(factors - retracted_mean, factors - mean)
+        mean = retracted_mean
+
+    for factors in added_factors_list:
+        factors = factors.astype(float)
+        count += 1
+        delta = factors - mean
+        mean += delta / count
+        squared_deviations += numpy.outer(delta, factors - mean)
+
+    return {'count': count, 'mean': mean, 'squared_deviations': squared_deviations}
+
+
+def update_covariance_accumulator(survey_id, version, retracted_factors_list, added_factors_list):
+    """
+    Retract and add factors of participants from covariance accumulator with Welford's method
+    Factors with unanswered question are not counted, and accumulator of other version of questions is left to be rebuilt
+    Row of accumulator is locked, so it is updated only by answers of users who completed survey
+    Deltas are journaled as well for each rebuild of same version by `rebuild_covariance_accumulator` in progress
+    """
+    retracted_factors_list = [x for x in retracted_factors_list if (x != UNANSWERED_FACTOR).all()]
+    added_factors_list = [x for x in added_factors_list if (x != UNANSWERED_FACTOR).all()]
+    if len(retracted_factors_list) == 0 and len(added_factors_list) == 0:
+        return None
+
+    connection = get_redis_connection('default')
+    key = get_covariance_accumulator_key(survey_id)
+
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        journal_keys = [x for x in connection.smembers(key + ':journals') if (':' + str(version) + ':') in x]
+        if len(journal_keys) > 0:
+            entries = ['r' + x.astype(numpy.int8).tobytes() for x in retracted_factors_list] + \
+                ['a' + x.astype(numpy.int8).tobytes() for x in added_factors_list]
+            pipeline = connection.pipeline(transaction=False)
+            for journal_key in journal_keys:
+                pipeline.rpush(journal_key, *entries)
+                pipeline.expire(journal_key, getattr(settings, 'CACHE_BUILD_LOCK_TIMEOUT'))
+            pipeline.execute()
+        
+        with transaction.atomic():
+            try:
+                accumulator = CovarianceAccumulator.objects.select_for_update().get(survey_id=survey_id)
+            except CovarianceAccumulator.DoesNotExist:
+                return None
+            
+            if accumulator.questions_version != version:
+                return None
+            
+            unpacked = apply_covariance_deltas(unpack_covariance_accumulator(accumulator), 
+                    retracted_factors_list, added_factors_list)
+            accumulator.count = unpacked['count']
+            accumulator.mean = unpacked['mean'].tobytes()
+            accumulator.squared_deviations = unpacked['squared_deviations'].tobytes()
+            accumulator.save()
+
+    return accumulator
+
+
+def update_covariance_of_participants(survey_obj, users_id_list, participated):
+    """
+    Add factors of users who became participants to covariance accumulator, or retract those of users who left
+    Cached factor vectors are used first and the others are read from DB
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    users_id_list = list(users_id_list)
+    if len(users_id_list) == 0:
+        return None
+
+    version = get_cache_version('survey:' + str(survey_obj.id) + ':questions')
+    keys = [get_factor_vector_key(user_id, survey_obj.id) for user_id in users_id_list]
+    cache_values = cache.get_many(keys)
+
+    factors_list = []
+    uncached_users_id_list = []
+    for user_id, key in zip(users_id_list, keys):
+        if key in cache_values and cache_values[key]['version'] == version:
+            factors_list.append(numpy.frombuffer(cache_values[key]['factors'], dtype=numpy.int8))
         else:
-            factor_list.append(factor)
-        updated_at_list.append(answer.updated_at)
+            uncached_users_id_list.append(user_id)
+
+    if len(uncached_users_id_list) > 0:
+        factors_list.extend(list(get_factor_matrix_of_users(survey_obj, uncached_users_id_list)[0]))
 
-    return {'economic_score': user_obj.economic_score, 'factor_list': factor_list, 'updated_at': max(updated_at_list)}
+    if participated == True:
+        return update_covariance_accumulator(survey_obj.id, version, [], factors_list)
+    else:
+        return update_covariance_accumulator(survey_obj.id, version, factors_list, [])
 
 
-def get_agreement_score_result(user_data, *target_data):
+def get_distribution_key(survey_id):
+    """
+    Get Redis key of hash which counts answers of each choice in survey
+    Field is choice ID, and field 'built' is set once counters are fully built
+    """
+    return 'survey:' + str(survey_id) + ':distribution'
+
+
+def rebuild_choice_distribution(survey_obj):
+    """
+    Rebuild counters of answers of each choice in survey from answers table
+    Counters are built in temporary hash and replace old one at once
+    Deltas which arrive while answers are counted are journaled and applied to new counters, so they are not lost
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    connection = get_redis_connection('default')
+    key = get_distribution_key(survey_obj.id)
+    journal_key = key + ':journal:' + uuid4().hex
+    temporary_key = key + ':' + uuid4().hex
+    timeout = getattr(settings, 'CACHE_BUILD_LOCK_TIMEOUT')
+
+    # Journals expire in case rebuild fails before its journal is applied
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        pipeline = connection.pipeline(transaction=True)
+        pipeline.sadd(key + ':journals', journal_key)
+        pipeline.expire(key + ':journals', timeout)
+        pipeline.execute()
+
+    # Default ordering of answer would be added to GROUP BY, so it is cleared
+    counts = dict(Answer.objects.filter(choice__question__survey=survey_obj).order_by().\
+        values('choice_id').annotate(count=Count('id')).values_list('choice_id', 'count'))
+
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        for choice_id, delta in connection.hgetall(journal_key).iteritems():
+            counts[int(choice_id)] = counts.get(int(choice_id), 0) + int(delta)
+        counts['built'] = 1
+        
+        pipeline = connection.pipeline(transaction=True)
+        pipeline.hmset(temporary_key, counts)
+        pipeline.rename(temporary_key, key)
+        pipeline.srem(key + ':journals', journal_key)
+        pipeline.delete(journal_key)
+        pipeline.execute()
+
+    del counts['built']
+    return counts
+
+
+def update_choice_distribution(survey_id, choice_deltas):
+    """
+    Increase or decrease counters of answers of choices in survey
+    Choice deltas is dictionary whose key is choice ID and value is delta of count
+    Deltas are journaled as well for each rebuild by `rebuild_choice_distribution` in progress
+    """
+    connection = get_redis_connection('default')
+    key = get_distribution_key(survey_id)
+
+    with cache.lock(key + ':lock', timeout=getattr(settings, 'CACHE_LOCK_TIMEOUT')):
+        journal_keys = connection.smembers(key + ':journals')
+        pipeline = connection.pipeline(transaction=False)
+        for choice_id, delta in choice_deltas.iteritems():
+            if delta != 0:
+                pipeline.hincrby(key, choice_id, delta)
+                for journal_key in journal_keys:
+                    pipeline.hincrby(journal_key, choice_id, delta)
+        for journal_key in journal_keys:
+            pipeline.expire(journal_key, getattr(settings, 'CACHE_BUILD_LOCK_TIMEOUT'))
+        pipeline.execute()
+
+
+def get_choice_distribution(survey_obj):
+    """
+    Get count of answers of each choice in survey with single read of counters
+    Counters are rebuilt from answers table only if they are not built yet
+    For example,
+        {1: 152, 2: 37, 5: 0}
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    counts = get_redis_connection('default').hgetall(get_distribution_key(survey_obj.id))
+    if 'built' not in counts:
+        return rebuild_choice_distribution(survey_obj)
+
+    del counts['built']
+    return dict((int(choice_id), int(count)) for choice_id, count in counts.iteritems())
+
+
+# Version of result record format
+#   (1) Python literal string such as "[{'name': 'User A', ...}]" or query string such as "1=3&2=-1"
+#   (2) JSON
+LEGACY_RECORD_VERSION = 1
+RECORD_VERSION = 2
+
+
+def serialize_record(rows):
+    """
+    Serialize rows of result record as JSON
+    [Input]
+        rows = [{'name': 'User A', 'similarity': 62.0}, {'name': "User B's", 'similarity': 54.0}]
+    [Output]
+        '[{"name":"User A","similarity":62.0},{"name":"User B's","similarity":54.0}]'
+    """
+    return json.dumps(rows, separators=(',', ':'))
+
+
+def deserialize_record(record, record_version=RECORD_VERSION):
+    """
+    Deserialize result record of any version into rows
+    [Input]
+        record = "[{'name': 'User A', 'similarity': 62.0}]"
+        record_version = 1
+    [Output]
+        [{u'name': u'User A', u'similarity': 62.0}]
+    """
+    if record is None or record == '':
+        return []
+
+    if record_version >= RECORD_VERSION:
+        return json.loads(record)
+
+    # Factor list record is stored as query string
+    if record[0] != '[':
+        return [int(pair.split('=')[1]) for pair in record.split('&')]
+
+    return json.loads(record.replace("'", '"'))
+
+
+def get_rows_of_result(result_obj):
+    """
+    Get rows of result record regardless of its version
+    """
+    return deserialize_record(result_obj.record, result_obj.record_version)
+
+
+def get_result_cache_key(survey_id, category, factors, *versions):
+    """
+    Get content-addressed cache key of result record
+    Users with identical factor vector share a record as long as versions of other inputs are not changed
+    """
+    digest = hashlib.sha1(':'.join(str(version) for version in versions))
+    digest.update(numpy.asarray(factors, dtype=numpy.int8).tobytes())
+
+    return 'survey:' + str(survey_id) + ':result:' + category + ':' + digest.hexdigest()
+
+
+def get_result_cache_counter_key(survey_id, category, counter):
+    """
+    Get cache key of hit or miss counter of result cache
+    """
+    return 'survey:' + str(survey_id) + ':result_cache:' + category + ':' + counter
+
+
+def get_cached_record(survey_id, category, key):
+    """
+    Get cached result record and count hit or miss
+    """
+    record = cache.get(key)
+    counter_key = get_result_cache_counter_key(survey_id, category, 'misses' if record is None else 'hits')
+    cache.add(counter_key, 0, timeout=None)
+    cache.incr(counter_key)
+
+    return record
+
+
+def set_cached_record(key, record):
+    """
+    Set result record which is shared by users with identical inputs
+    """
+    cache.set(key, record, timeout=getattr(settings, 'RESULT_CACHE_TTL'))
+
+
+def get_result_cache_stats(survey_obj):
+    """
+    Get hit rate of result cache by category to size the cache
+    For example,
+        {
+            'agreement_score': {'hits': 120, 'misses': 30, 'hit_rate': 0.8},
+            'city_block_distance': {'hits': 0, 'misses': 0, 'hit_rate': None}
+        }
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    stats = {}
+    for category, _ in getattr(settings, 'RESULT_CATEGORY_CHOICES'):
+        hits = cache.get(get_result_cache_counter_key(survey_obj.id, category, 'hits')) or 0
+        misses = cache.get(get_result_cache_counter_key(survey_obj.id, category, 'misses')) or 0
+        stats[category] = {'hits': hits, 
+                'misses': misses, 
+                'hit_rate': None if hits + misses == 0 else float(hits) / (hits + misses)}
+
+    return stats
+
+
+def get_valid_answers_count(factor_matrix):
+    """
+    Get count of answers which are neither 'unawareness'(=7) nor unanswered in each row of factor matrix
+    """
+    factor_matrix = numpy.atleast_2d(factor_matrix)
+
+    return ((factor_matrix != 7) & (factor_matrix != UNANSWERED_FACTOR)).sum(axis=1)
+
+
+def get_agreement_scores(user_matrix, target_matrix, valid_answers_count):
+    """
+    Get agreement scores of many users against all targets at once
+    User matrix is (users X questions) and target matrix is (targets X questions) matrix of factors
+    Return (users X targets) array of similarity, where similarity to target without valid answers is 0
+    For example,
+    [Input]
+        user_matrix = [[0, -2, 2], [1, 1, 2]]
+        target_matrix = [[1, 1, 1], [2, 2, 2]]
+        valid_answers_count = [3, 3]
+    [Output]
+        array([[  0.  ,  33.34],
+            [ 66.67,  33.34]])
+    """
+    user_matrix = numpy.atleast_2d(user_matrix)
+    target_matrix = numpy.atleast_2d(target_matrix)
+    valid_answers_count = numpy.asarray(valid_answers_count, dtype=float)
+    chunk_size = getattr(settings, 'FACTOR_MATRIX_CHUNK_SIZE')
+    agreement = numpy.empty((user_matrix.shape[0], target_matrix.shape[0]), dtype=numpy.int64)
+
+    # Compare in chunks to bound memory of (users X targets X questions) comparison
+    for start in range(0, user_matrix.shape[0], chunk_size):
+        chunk = user_matrix[start:start + chunk_size]
+        agreement[start:start + chunk_size] = (chunk[:, numpy.newaxis, :] == target_matrix[numpy.newaxis, :, :]).sum(axis=2)
+
+    # Target without valid answers scores 0 rather than NaN or inf, which is not valid JSON
+    scores = numpy.ceil(10000 * (agreement / numpy.maximum(valid_answers_count, 1))) / 100
+    scores[:, valid_answers_count == 0] = 0
+
+    return scores
+
+
+def get_agreement_score_result(user_data, target_matrix, valid_answers_count, *target_data):
     """
     Get agreement score algorithm result which compares target data with user’s data
+    Target matrix and valid answers count are cached with target data (see `get_agreement_scores`)
     For example,
     [Data]
         User's survey data
@@ -76,6 +1186,8 @@ def get_agreement_score_result(user_data, *target_data):
             'economic_score': 5, 
             'factor_list': [0, -2, 2]
         }
+        target_matrix = numpy.array([[1, 1, 1], [2, 2, 2]], dtype=numpy.int8)
+        valid_answers_count = numpy.array([3, 3])
         target_data = [{
             'name': 'User A', 
             'economic_score': 7, 
@@ -98,36 +1210,109 @@ def get_agreement_score_result(user_data, *target_data):
             'similarity': 62 
         }, 
         {
-            'name': 'User B', 
-            'economic_score': 3,
-            'similarity': 54
-        }]
+            'name': 'User B', 
+            'economic_score': 3,
+            'similarity': 54
+        }]
+    """
+    similarities = get_agreement_scores(user_data['factor_list'], target_matrix, valid_answers_count)[0]
+    record = []
+
+    # Add own data
+    record.append({'name': user_data['name'], 
+        'economic_score': user_data['economic_score'], 
+        'similarity': 100})
+
+    for single_target_data, similarity in zip(target_data, similarities):
+        record.append({'name': single_target_data['name'], 
+            'economic_score': single_target_data['economic_score'], 
+            'similarity': float(similarity)})
+
+    return serialize_record(record)
+
+
+# Maximum distance between two factors
+FACTOR_MAX_DISTANCE = getattr(settings, 'MAX_FACTOR_VALUE') - getattr(settings, 'MIN_FACTOR_VALUE')
+
+
+def get_questions_category_mask(questions_category):
+    """
+    Get categories and mask of questions in each category
+    Mask only depends on question set, so it should be calculated once and cached
+    For example,
+    [Input]
+        questions_category = ['category_a', 'category_b', 'category_a']
+    [Output]
+        {
+            'categories': ['category_a', 'category_b'],
+            'mask': array([[ True, False,  True],
+                [False,  True, False]], dtype=bool)
+        }
     """
-    user_array = numpy.array(user_data['factor_list'])
-    record = []
+    categories = list(set(questions_category))
+    mask = numpy.array([[question_category == category for question_category in questions_category] 
+        for category in categories], dtype=bool).reshape(len(categories), len(questions_category))
 
-    # Add own data
-    record.append("{'name': '" + user_data['name'] + "'," \
-            + "'economic_score': " + str(user_data['economic_score']) + "," \
-            + "'similarity': 100}")
+    return {'categories': categories, 'mask': mask}
 
-    for single_target_data in target_data:
-        origin = user_array
-        target_array = numpy.array(single_target_data['factor_list'])
-        question_count = len(target_array[target_array != 7])
-        agreement = numpy.sum(numpy.array(origin) == target_array)
-        max_agreement = question_count
-        similarity = math.ceil(10000 * (agreement / float(max_agreement))) / 100
-        record.append("{'name': '" + single_target_data['name'] + "'," \
-                + "'economic_score': " + str(single_target_data['economic_score']) + "," \
-                + "'similarity': " + str(similarity) + "}")
 
-    return '[' + ', '.join(record) + ']'
+def get_city_block_distances(questions_category, user_factors, target_matrix):
+    """
+    Get factor sums and similarities of user and all targets in every category with matrix operations
+    Target matrix is (targets X questions) matrix of factors
+    Return dictionary of arrays
+        'factor_sum': (user and targets X categories) arrays of minimum, maximum, expected factor sum and unawareness count
+        'similarity': (targets) array of similarity with all questions
+        'category_similarity': (targets X categories) array of similarity with questions in each category
+    Similarity is None where there is no question which both user and target answered
+    """
+    mask = questions_category['mask'].astype(numpy.int64)
+    user_factors = numpy.asarray(user_factors, dtype=numpy.int64)
+    target_matrix = numpy.asarray(target_matrix, dtype=numpy.int64).reshape(-1, len(user_factors))
+    factor_matrix = numpy.vstack((user_factors, target_matrix))
+
+    # Dealing exception if user answered as 'unawareness' when calculate factor sum
+    # Substitue value '7' for average value of that category
+    questions_count = mask.sum(axis=1)
+    unawareness_answers_count = (factor_matrix == 7).astype(numpy.int64).dot(mask.T)
+    original_factor_sum = factor_matrix.dot(mask.T) - 7 * unawareness_answers_count
+    answered_count = questions_count - unawareness_answers_count
+    average_value = numpy.where(answered_count == 0, 0, original_factor_sum // numpy.maximum(answered_count, 1))
+
+    # Compare only questions which both user and target did not answer as 'unawareness'
+    valid = (user_factors != 7) & (target_matrix != 7)
+    disagreement = numpy.absolute(target_matrix - user_factors) * valid
+    max_disagreement = (numpy.absolute(user_factors) + FACTOR_MAX_DISTANCE // 2) * valid
+
+    return {
+        'factor_sum': {
+            'original': original_factor_sum,
+            'minimum': original_factor_sum - 3 * unawareness_answers_count,
+            'maximum': original_factor_sum + 3 * unawareness_answers_count,
+            'expected': original_factor_sum + average_value * unawareness_answers_count,
+            'unawareness_count': unawareness_answers_count
+        },
+        'similarity': get_similarity_from_disagreement(disagreement.sum(axis=1), max_disagreement.sum(axis=1)),
+        'category_similarity': get_similarity_from_disagreement(disagreement.dot(mask.T), max_disagreement.dot(mask.T))
+    }
+
+
+def get_similarity_from_disagreement(disagreement, max_disagreement):
+    """
+    Get similarity array from disagreement and max disagreement arrays
+    Similarity is None where max disagreement is not positive
+    """
+    max_disagreement = max_disagreement.astype(float)
+    valid = max_disagreement > 0
+    similarity = numpy.ceil(100 * (1 - (disagreement / numpy.where(valid, max_disagreement, 1))))
+
+    return numpy.where(valid, similarity, None)
 
 
 def get_city_block_distance_result(questions_category, user_data, *target_data):
     """
     Get city block distance algorithm result which compares target data with user’s data
+    Factor sums and similarities of all targets and categories are calculated at once by `get_city_block_distances`
     For example,
     [Data]
         User's survey data
@@ -137,7 +1322,7 @@ def get_city_block_distance_result(questions_category, user_data, *target_data):
         User B(2nd comparison target)'s survey data
             factor_list = [2, 2, 2]
     [Input]
-        questions_category = ['category_a', 'category_b', 'category_a']
+        questions_category = get_questions_category_mask(['category_a', 'category_b', 'category_a'])
         user_data = [0, -2, 2]
         target_data = [{
             'name': 'User A', 
@@ -219,149 +1404,275 @@ def get_city_block_distance_result(questions_category, user_data, *target_data):
             'similarity': 54 
         }]
     """
-    question_count = len(user_data)
-    categories = list(set(questions_category))
+    categories = questions_category['categories']
     record = []
 
-    # Calculate factor sum for user
-    user_factor_sum = {}
-    for category in categories:
-        valid_index_list = []
-        for index, question_category in enumerate(questions_category):
-            if question_category == category:
-                valid_index_list.append(index)
-        
-        temp_user_data = list(user_data[i] for i in valid_index_list)
-        
-        # Dealing exception if user answered as 'unawareness' when calculate factor sum
-        # Substitue value '7' for average value of that category
-        unanwareness_answers_count = temp_user_data.count(7)
-        original_factor_sum = sum(temp_user_data) - 7 * unanwareness_answers_count 
-        minimum_factor_sum = original_factor_sum - 3 * unanwareness_answers_count
-        maximum_factor_sum = original_factor_sum + 3 * unanwareness_answers_count
-        
-        if len(temp_user_data) == unanwareness_answers_count:
-            average_value = 0
-        else:
-            average_value = (sum(temp_user_data) - 7 * unanwareness_answers_count) / (len(temp_user_data) - unanwareness_answers_count)
-        temp_user_data = [average_value if x == 7 else x for x in temp_user_data]
-        expected_factor_sum = sum(temp_user_data)
+    for single_target_data in target_data:
+        if len(single_target_data['factor_list']) != len(user_data):
+            raise ValueError(single_target_data['factor_list'])
+
+    target_matrix = [single_target_data['factor_list'] for single_target_data in target_data]
+    distances = get_city_block_distances(questions_category, user_data, target_matrix)
+    factor_sum = distances['factor_sum']
+
+    # Factor sum for user(=first row) and comparison targets
+    names = ['me'] + [single_target_data['name'] for single_target_data in target_data]
+    for row, name in enumerate(names):
+        row_factor_sum = {}
+        for column, category in enumerate(categories):
+            unanwareness_answers_count = factor_sum['unawareness_count'][row, column]
+            if unanwareness_answers_count == 0:
+                row_factor_sum[category] = str(factor_sum['original'][row, column])
+            else:
+                row_factor_sum[category] = str(factor_sum['minimum'][row, column]) + ':' + \
+                    str(factor_sum['maximum'][row, column]) + ':' + \
+                    str(factor_sum['expected'][row, column]) + ':' + str(unanwareness_answers_count)
         
-        if unanwareness_answers_count == 0:
-            user_factor_sum[category] = str(original_factor_sum) 
-        else:
-            user_factor_sum[category] = str(minimum_factor_sum) + ':' + str(maximum_factor_sum) + ':' + str(expected_factor_sum) + ':' + str(unanwareness_answers_count)
+        row_factor_sum['classification'] = 'factor_sum'
+        row_factor_sum['name'] = name
+        record.append(row_factor_sum)
 
-    temp_string = ""
-    for key, value in user_factor_sum.iteritems(): 
-        temp_string += ",'" + key + "': '" + value + "'"
+    # Similarity by comparing with all questions, and then with specific category
+    similarities = [('all', distances['similarity'])]
+    for column, category in enumerate(categories):
+        similarities.append((category, distances['category_similarity'][:, column]))
 
-    record.append("{'classification': 'factor_sum', 'name': 'me'" + temp_string + "}")
+    for category, similarity in similarities:
+        for single_target_data, agreement_score in zip(target_data, similarity):
+            agreement_score = 0 if agreement_score is None else float(agreement_score)
+            record.append({'classification': 'category', 
+                'category': category, 
+                'name': single_target_data['name'], 
+                'color': single_target_data['color'], 
+                'is_reliable': str(single_target_data['is_reliable']), 
+                'similarity': agreement_score})
 
-    # Calculate factor sum for comparison targets
-    for single_target_data in target_data:
-        target_factor_sum = {}
-        target_factor_list = single_target_data['factor_list']
+    return serialize_record(record)
+
+
+def create_results(user_obj, survey_obj, categories):
+    """
+    Create results of user in given categories from single load of inputs
+    Existing result is reused in each category unless its inputs are updated after the result is created
+    New results are inserted at once
+    Returns dictionary of result object and whether it is created by category
+    """
+    # Avoid circular import
+    from utils import redis
+
+    if isinstance(user_obj, User) == False:
+        raise ValueError('Invalid variable')
+
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    if isinstance(categories, list) == False or len(categories) == 0:
+        raise ValueError('Invalid variable')
+
+    for category in categories:
+        if category not in [x[0] for x in getattr(settings, 'RESULT_CATEGORY_CHOICES')]:
+            raise ValueError('Invalid variable')
+
+    # Latest result of each category
+    results = {}
+    for result in Result.objects.filter(survey=survey_obj, user=user_obj, category__in=categories).order_by('-id'):
+        results.setdefault(result.category, result)
+    
+    # Flush buffered answers of user before completing survey
+    if getattr(settings, 'USE_ANSWER_BUFFER') == True:
+        flush_answer_buffers(survey_obj, [user_obj.id])
+    
+    # Choose 'unawareness' for unaswered questions
+    if is_participant(user_obj, survey_obj) == False:
+        all_questions = redis.get_cache(survey_obj, redis.set_questions_cache)
+        factor_vector = get_factor_vector(user_obj, survey_obj)
+        unawareness_choices = redis.get_cache(survey_obj, redis.set_unawareness_choices_cache, 
+                lambda x: x['version'] == factor_vector['version'])['choices']
+        
+        # Choose 'unawareness' for unaswered questions in cached factor vector, or choose randomly if failed
+        chosen_choices_id_list = []
+        for question, factor in zip(all_questions, factor_vector['factors']):
+            if factor == UNANSWERED_FACTOR:
+                choice_id = unawareness_choices[question['id']]
+                if choice_id is None:
+                    choice_id = random.choice(question['choices'])['id']
+                chosen_choices_id_list.append(choice_id)
+        
+        # Add user to participant list of survey together with answers
+        with transaction.atomic():
+            Answer.objects.bulk_create([Answer(user=user_obj, choice_id=choice_id) for choice_id in chosen_choices_id_list])
+            survey_obj.participants.add(user_obj)
+        update_choice_distribution(survey_obj.id, dict((choice_id, 1) for choice_id in chosen_choices_id_list))
+        
+        # Economic score of user is not changed by 'unawareness'
+        choices = get_choices_of_questions(all_questions)
+        update_factor_vector(user_obj.id, survey_obj.id, 
+                [choices[choice_id] for choice_id in chosen_choices_id_list], update_economic_score=False)
+    
+    comparison_targets = redis.get_cache(survey_obj, redis.set_survey_data_of_comparison_targets_cache, 
+            lambda x: 'version' in x)
+    
+    # Data of comparison target
+    target_data = comparison_targets['data']
+    comparison_targets_updated_at = comparison_targets['updated_at']
+    
+    user_data = get_survey_data_of_user(user_obj, survey_obj)
+    
+    if 'pca' in categories:
+        rotation_matrix = redis.get_cache(survey_obj, redis.set_rotation_matrix_cache, lambda x: 'version' in x)
+    
+    created_results = []
+    for category in categories:
+        result = results.get(category)
         
-        for category in categories:
-            valid_index_list = []
-            for index, question_category in enumerate(questions_category):
-                if question_category == category:
-                    valid_index_list.append(index)
+        if category == 'factor_list':
+            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
+            #   (1) Result is exist
+            #   (2) User's answers are not updated after result object is created 
+            if result is not None and result.updated_at > user_data['updated_at']:
+                continue
             
-            try:
-                temp_target_factor_list = list(target_factor_list[i] for i in valid_index_list)
-            except:
-                raise ValueError(target_factor_list)
+            factor_list = user_data['factor_list']
             
-            # Dealing exception if user answered as 'unawareness' when calculate factor sum
-            # Substitue value '7' for average value of that category
-            unanwareness_answers_count = temp_target_factor_list.count(7)
-            original_factor_sum = sum(temp_target_factor_list) - 7 * unanwareness_answers_count 
-            minimum_factor_sum = original_factor_sum - 3 * unanwareness_answers_count
-            maximum_factor_sum = original_factor_sum + 3 * unanwareness_answers_count
+            # Get question count
+            questions_count = redis.get_cache(survey_obj, redis.set_questions_count_cache)
             
-            if len(temp_target_factor_list) == unanwareness_answers_count:
-                average_value = 0
-            else:
-                average_value = (sum(temp_target_factor_list) - 7 * unanwareness_answers_count) / (len(temp_target_factor_list) - unanwareness_answers_count)
-            temp_target_factor_list = [average_value if x == 7 else x for x in temp_target_factor_list]
-            expected_factor_sum = sum(temp_target_factor_list)
+            record = serialize_record(factor_list[:questions_count])
+        
+        elif category == 'agreement_score':
+            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
+            #   (1) Result is exist
+            #   (2) User's answers are not updated after result object is created 
+            if result is not None and result.updated_at > user_data['updated_at']:
+                continue
             
-            if unanwareness_answers_count == 0:
-                target_factor_sum[category] = str(original_factor_sum) 
-            else:
-                target_factor_sum[category] = str(minimum_factor_sum) + ':' + str(maximum_factor_sum) + ':' + str(expected_factor_sum) + ':' + str(unanwareness_answers_count)
+            # Users with identical answers and economic score share the record
+            record_key = get_result_cache_key(survey_obj.id, category, user_data['factors'], 
+                    user_data['version'], comparison_targets['version'], user_data['economic_score'])
+            record = get_cached_record(survey_obj.id, category, record_key)
+            if record is None:
+                # Data of user is shared by categories, so DO NOT rename it in place
+                user_dict = dict(user_data, name='나')
+                record = get_agreement_score_result(user_dict, 
+                        comparison_targets['matrix'], comparison_targets['valid_answers_count'], *target_data)
+                set_cached_record(record_key, record)
         
-        temp_string = ""
-        for key, value in target_factor_sum.iteritems(): 
-            temp_string += ",'" + key + "': '" + value + "'"
+        elif category == 'city_block_distance':
+            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
+            #   (1) Result is exist
+            #   (2) User's answers are not updated after result object is created 
+            #   (3) Answers of comparison targets are not updated after result object is created
+            if result is not None and \
+                    result.updated_at > user_data['updated_at'] and \
+                    result.updated_at > max(comparison_targets_updated_at):
+                continue
+            
+            # Users with identical answers share the record
+            record_key = get_result_cache_key(survey_obj.id, category, user_data['factors'], 
+                    user_data['version'], comparison_targets['version'])
+            record = get_cached_record(survey_obj.id, category, record_key)
+            if record is None:
+                # Category mask is rebuilt only when questions are changed
+                questions_category = redis.get_cache(survey_obj, redis.set_questions_category_cache, 
+                        lambda x: x['version'] == user_data['version'])
+                
+                record = get_city_block_distance_result(questions_category, user_data['factor_list'], *target_data)
+                set_cached_record(record_key, record)
         
-        record.append("{'classification': 'factor_sum', 'name': '" + single_target_data['name'] + "'" + temp_string + "}")
-
-    # Calculate similarity by comparing with all questions
-    for single_target_data in target_data:
-        user_array = numpy.array(user_data)
-        target_factor_list = numpy.array(single_target_data['factor_list'])
-        user_array_na = user_array != 7
-        target_factor_list_na = target_factor_list != 7
-        na_filter = user_array_na & target_factor_list_na
-        user_array = user_array[na_filter]
-        target_factor_list = target_factor_list[na_filter]
-        qnum = len(user_array)
-        disagreement = sum(numpy.absolute(numpy.subtract(user_array, target_factor_list)))
-        factor_max_distance = getattr(settings, 'MAX_FACTOR_VALUE') - getattr(settings, 'MIN_FACTOR_VALUE')
-        max_disagreement = float(sum(numpy.absolute(user_array) + factor_max_distance / 2))
-        if max_disagreement <= 0:
-            agreement_score = 0
-        else:
-            agreement_score = math.ceil(100 * (1 - (disagreement / max_disagreement)))
-        record.append("{'classification': 'category', 'category': 'all'," \
-                + "'name': '" + single_target_data['name'] + "'," \
-                + "'color': '" + single_target_data['color'] + "'," \
-                + "'is_reliable': '" + str(single_target_data['is_reliable']) + "'," \
-                + "'similarity': " + str(agreement_score) + "}")
-
-    # Calculate similarity by comparing with specific category
-    for category in categories:
-        valid_index_list = []
-        for index, question_category in enumerate(questions_category):
-            if question_category == category:
-                valid_index_list.append(index)
+        elif category == 'pca':
+            # Get ID of result object(=DO NOT CREATE NEW ONE) only if 
+            #   (1) Result is exist
+            #   (2) User's answers are not updated after result object is created 
+            #   (3) Answers of comparison targets are not updated after result object is created
+            #   (4) Rotation matrix is not updated after result object is created
+            if result is not None and \
+                    result.updated_at > user_data['updated_at'] and \
+                    result.updated_at > max(comparison_targets_updated_at) and \
+                    result.updated_at > rotation_matrix['updated_at']:
+                continue
+            
+            # Users with identical answers share the record
+            record_key = get_result_cache_key(survey_obj.id, category, user_data['factors'], 
+                    user_data['version'], comparison_targets['version'], rotation_matrix['version'])
+            record = get_cached_record(survey_obj.id, category, record_key)
+            if record is None:
+                # Coordinates of comparison targets are cached per rotation matrix, so project only user data
+                target_coordinates = cache.get('survey:' + str(survey_obj.id) + ':rotation_matrix:' + str(rotation_matrix['id']) + 
+                        ':comparison_targets:coordinates')
+                if target_coordinates is None or \
+                        target_coordinates['version'] != comparison_targets['version'] or \
+                        target_coordinates.get('rotation_matrix_version') != rotation_matrix['version']:
+                    target_coordinates = redis.set_pca_coordinates_of_comparison_targets_cache(survey_obj)
+                user_coordinates = get_pca_coordinates(user_data['factor_list'], unpack_rotation_matrix(
+                        rotation_matrix['matrix_data'], rotation_matrix['matrix_rows'], rotation_matrix['matrix_columns']))
+                
+                user_dict = {'name': '나',
+                    'color': '#9b59b6',
+                    'factor_list': user_data['factor_list']}
+                
+                # Cached data of comparison targets is shared, so DO NOT append user data to it
+                record = get_pca_result(list(target_coordinates['coordinates']) + list(user_coordinates), 
+                        *(target_data + [user_dict]))
+                set_cached_record(record_key, record)
         
-        temp_user_data = list(user_data[i] for i in valid_index_list)
+        result = Result(user=user_obj, survey=survey_obj, record=record, record_version=RECORD_VERSION, category=category)
+        if category == 'city_block_distance':
+            result.expected_target = user_obj.supporting_party
+        elif category == 'pca':
+            result.x_axis_name = rotation_matrix['x_axis_name']
+            result.y_axis_name = rotation_matrix['y_axis_name']
+        created_results.append(result)
+    
+    output = {}
+    for category, result in results.iteritems():
+        output[category] = (result, False)
+    
+    if len(created_results) > 0:
+        Result.objects.bulk_create(created_results)
         
-        for single_target_data in target_data:
-            user_array = numpy.array(temp_user_data)
-            temp = single_target_data['factor_list']
-            target_factor_list = list(temp[i] for i in valid_index_list)
-            target_factor_list = numpy.array(target_factor_list)
-            user_array_na = user_array != 7
-            target_factor_list_na = target_factor_list != 7
-            na_filter = user_array_na & target_factor_list_na
-            user_array = user_array[na_filter]
-            target_factor_list = target_factor_list[na_filter]
-            qnum = len(user_array)
-            disagreement = sum(numpy.absolute(numpy.subtract(user_array, target_factor_list)))
-            factor_max_distance = getattr(settings, 'MAX_FACTOR_VALUE') - getattr(settings, 'MIN_FACTOR_VALUE')
-            max_disagreement = float(sum(numpy.absolute(user_array) + factor_max_distance / 2))
-            if max_disagreement <= 0:
-                agreement_score = 0
-            else:
-                agreement_score = math.ceil(100 * (1 - (disagreement / max_disagreement)))
-            record.append("{'classification': 'category', 'category': '" + category + "'," \
-                    + "'name': '" + single_target_data['name'] + "'," \
-                    + "'color': '" + single_target_data['color'] + "'," \
-                    + "'is_reliable': '" + str(single_target_data['is_reliable']) + "'," \
-                    + "'similarity': " + str(agreement_score) + "}")
+        # Bulk insert does not set primary key on MySQL, so read IDs of inserted results back
+        created_categories = [x.category for x in created_results]
+        created_ids = {}
+        for result_id, category in Result.objects.filter(survey=survey_obj, user=user_obj, category__in=created_categories) \
+                .order_by('-id').values_list('id', 'category'):
+            created_ids.setdefault(category, result_id)
+        
+        for result in created_results:
+            result.id = created_ids[result.category]
+            output[result.category] = (result, True)
+    
+    return output
+
+
+def get_result_task_key(user_id, survey_id, categories):
+    """
+    Get cache key of result computation in flight, whose value is pending ID
+    """
+    return 'survey:' + str(survey_id) + ':result_task:' + ','.join(sorted(categories)) + ':' + str(user_id)
+
+
+def set_result_status(pending_id, user_id, state, result_ids=None):
+    """
+    Set status of pending results which is one of 'PENDING', 'SUCCESS' and 'FAILURE'
+    IDs of results are given by category
+    """
+    cache.set('result:' + pending_id + ':status', 
+            {'user': user_id, 'state': state, 'ids': result_ids}, 
+            timeout=getattr(settings, 'RESULT_TASK_TIMEOUT'))
+
 
-    return '[' + ', '.join(record) + ']'
+def get_result_status(pending_id):
+    """
+    Get status of pending result, or None if pending ID is unknown or expired
+    """
+    return cache.get('result:' + pending_id + ':status')
 
 
 def get_rotation_matrix(survey_obj):
     """
-    Get rotation matrix with whole data
+    Get rotation matrix from covariance of factors of whole participants
     Rotation matrix will be used for PCA method
+    Count of components is `principal_components_count` of survey and `PCA_ENGINE` decides how they are computed
     [Example of output with 3 questions]
         (
             array([[ 0.10296105,  0.95214155],
@@ -380,38 +1691,27 @@ def get_rotation_matrix(survey_obj):
     if isinstance(survey_obj, Survey) == False:
         raise ValueError('Invalid variable')
 
-    all_list = []
     questions = Question.objects.filter(survey=survey_obj).order_by('id')
-    completed_users = survey_obj.participants.all()
 
-    for completed_user in completed_users:
-        all_list.append(get_survey_data_of_user(completed_user, survey_obj)['factor_list'])
-
-    all_list = numpy.array(all_list)
-    weighted_list = all_list.astype(float)
-    qnum = all_list.shape[1]
-    mean_vec = numpy.mean(weighted_list, axis=0)
-    cov_mat = (weighted_list - mean_vec).T.dot((weighted_list - mean_vec)) / (weighted_list.shape[0]-1)
-    eig_vals, eig_vecs = numpy.linalg.eigh(cov_mat)
-
-    for ev in eig_vecs:
-        numpy.testing.assert_array_almost_equal(1.0, numpy.linalg.norm(ev))
-    
-    # Make a list of (eigenvalue, eigenvector, relevant question ID) tuples
-    eig_pairs = [(numpy.abs(eig_vals[i]), eig_vecs[:,i], questions[i].id) for i in range(len(eig_vals))]
+    # Covariance is kept up to date as answers arrive, so only questions x questions matrix is decomposed
+    accumulator = get_covariance_accumulator(survey_obj)
+    qnum = len(accumulator['mean'])
+    cov_mat = accumulator['squared_deviations'] / (accumulator['count'] - 1)
+    components_count = min(survey_obj.principal_components_count, qnum)
+    eig_vals, eig_vecs = get_principal_axes(cov_mat, components_count, getattr(settings, 'PCA_ENGINE'))
     
-    # Sort the tuples as descending order 
-    eig_pairs.sort()
-    eig_pairs.reverse()
-    tot = sum(eig_vals)
-    sorted(eig_vals, reverse=True)
+    # Make a list of (eigenvalue, eigenvector, relevant question ID) tuples in descending order
+    #   Question is matched with index of eigenvalue in ascending order of whole spectrum as before
+    eig_pairs = [(numpy.abs(eig_vals[i]), eig_vecs[:,i], questions[qnum - 1 - i].id) for i in range(len(eig_vals))]
     
     # SCREE PLOT (Examine Heuristically) - cumulated accuracy value
-    var_exp = [(i/tot)*100 for i in sorted(eig_vals, reverse=True)]
+    #   Sum of whole eigenvalues is trace of covariance matrix, so it is known without computing all of them
+    tot = numpy.trace(cov_mat)
+    var_exp = [(i/tot)*100 for i in eig_vals]
     cum_var_exp = numpy.cumsum(var_exp).tolist()
     
-    # Changes with Desired Dimensions (d = 2 for the moment)
-    rotation_matrix = numpy.hstack((eig_pairs[0][1].reshape(qnum,1), eig_pairs[1][1].reshape(qnum,1))).tolist()
+    # Changes with Desired Dimensions
+    rotation_matrix = eig_vecs[:, :components_count].tolist()
 
     refined_eig_pairs = []
     for eig_pair in eig_pairs:
@@ -420,17 +1720,157 @@ def get_rotation_matrix(survey_obj):
     return rotation_matrix, refined_eig_pairs, cum_var_exp
 
 
-def get_pca_result(rotation_matrix, *target_data):
+# Rotation matrix is stored and cached as raw buffer of this type
+ROTATION_MATRIX_DTYPE = numpy.dtype('<f8')
+
+
+def pack_rotation_matrix(matrix):
+    """
+    Pack matrix into raw float64 buffer together with its shape
+    Return dictionary of fields of rotation matrix object
+    """
+    matrix = numpy.ascontiguousarray(matrix, dtype=ROTATION_MATRIX_DTYPE)
+    if matrix.ndim != 2:
+        raise ValueError('Invalid variable')
+
+    return {'matrix_data': matrix.tobytes(),
+            'matrix_rows': matrix.shape[0],
+            'matrix_columns': matrix.shape[1]}
+
+
+def unpack_rotation_matrix(matrix_data, matrix_rows, matrix_columns):
+    """
+    Get read-only view of matrix over raw float64 buffer without parsing or copying
+    Buffer could be bytes or memory-mapped uint8 array shared by processes
+    """
+    if isinstance(matrix_data, numpy.ndarray):
+        return matrix_data.view(ROTATION_MATRIX_DTYPE).reshape(matrix_rows, matrix_columns)
+
+    return numpy.frombuffer(matrix_data, dtype=ROTATION_MATRIX_DTYPE).reshape(matrix_rows, matrix_columns)
+
+
+def get_matrix_of_rotation_matrix(rotation_matrix_obj):
+    """
+    Get matrix of rotation matrix object, where legacy row which is not converted yet is parsed from text
+    """
+    if isinstance(rotation_matrix_obj, RotationMatrix) == False:
+        raise ValueError('Invalid variable')
+
+    if rotation_matrix_obj.matrix_data is None:
+        return numpy.array(literal_eval(rotation_matrix_obj.matrix), dtype=ROTATION_MATRIX_DTYPE)
+
+    return unpack_rotation_matrix(bytes(rotation_matrix_obj.matrix_data), 
+            rotation_matrix_obj.matrix_rows, rotation_matrix_obj.matrix_columns)
+
+
+def increase_completions_since_rotation_matrix(surveys_id_list, count):
+    """
+    Increase count of users who completed surveys after latest rotation matrix
+    QuerySet update does not touch updated datetime or send signal, so cache of surveys is kept
+    """
+    Survey.objects.filter(id__in=surveys_id_list).\
+        update(completions_since_rotation_matrix=F('completions_since_rotation_matrix') + count)
+
+
+def get_rotation_matrix_drift(old_matrix, new_matrix):
+    """
+    Get drift of principal axes between rotation matrices as largest (1 - |cosine|) of matched axes
+    Sign of axis is arbitrary, so axes pointing opposite directions are same
+    Drift is infinite if rotation matrices have different shapes
+    """
+    old_matrix = numpy.asarray(old_matrix, dtype=float)
+    new_matrix = numpy.asarray(new_matrix, dtype=float)
+
+    if old_matrix.shape != new_matrix.shape:
+        return float('inf')
+
+    cosines = (old_matrix * new_matrix).sum(axis=0) / \
+        (numpy.linalg.norm(old_matrix, axis=0) * numpy.linalg.norm(new_matrix, axis=0))
+
+    return float((1 - numpy.abs(cosines)).max())
+
+
+def get_principal_axes(cov_mat, components_count, engine='eigh'):
+    """
+    Get eigenvalues in descending order and eigenvectors as columns of covariance matrix
+    [Engine]
+        'eigh': Decompose whole covariance matrix, so all components are given
+        'randomized': Compute only top components by randomized subspace iteration
+            Falls back to 'eigh' if there is no room for oversampling or axes are not accurate enough
+    """
+    if engine not in ('eigh', 'randomized'):
+        raise ValueError('Invalid variable')
+
+    if engine == 'randomized':
+        qnum = cov_mat.shape[0]
+        subspace_size = components_count + getattr(settings, 'PCA_OVERSAMPLING')
+        if subspace_size < qnum:
+            # Power iterations sharpen the subspace to top components of covariance matrix
+            random_state = numpy.random.RandomState(getattr(settings, 'PCA_RANDOM_SEED'))
+            subspace = numpy.linalg.qr(cov_mat.dot(random_state.standard_normal((qnum, subspace_size))))[0]
+            for i in range(getattr(settings, 'PCA_POWER_ITERATIONS')):
+                subspace = numpy.linalg.qr(cov_mat.dot(subspace))[0]
+            
+            # Decompose small projected matrix and lift its eigenvectors back
+            eig_vals, eig_vecs = numpy.linalg.eigh(subspace.T.dot(cov_mat).dot(subspace))
+            order = numpy.argsort(eig_vals)[::-1][:components_count]
+            eig_vals = eig_vals[order]
+            eig_vecs = subspace.dot(eig_vecs[:, order])
+            
+            if validate_principal_axes(cov_mat, eig_vals, eig_vecs) == True:
+                return eig_vals, eig_vecs
+
+    eig_vals, eig_vecs = numpy.linalg.eigh(cov_mat)
+    order = numpy.argsort(eig_vals)[::-1]
+
+    return eig_vals[order], eig_vecs[:, order]
+
+
+def validate_principal_axes(cov_mat, eig_vals, eig_vecs, tolerance=None):
+    """
+    Check whether eigenvectors are orthonormal and satisfy C * v = lambda * v within tolerance
+    Residual is relative to largest eigenvalue, so tolerance does not depend on scale of factors
+    """
+    if tolerance is None:
+        tolerance = getattr(settings, 'PCA_AXES_TOLERANCE')
+
+    if numpy.abs(eig_vecs.T.dot(eig_vecs) - numpy.eye(eig_vecs.shape[1])).max() > tolerance:
+        return False
+
+    scale = max(numpy.abs(eig_vals).max(), numpy.finfo(float).eps)
+    residuals = numpy.linalg.norm(cov_mat.dot(eig_vecs) - eig_vecs * eig_vals, axis=0) / scale
+
+    return bool((residuals <= tolerance).all())
+
+
+def get_pca_coordinates(factor_matrix, rotation_matrix):
     """
-    Get PCA algorithm result which multiply target data(including user data) by rotation matrix
+    Get PCA coordinates of many users at once by multiplying stacked factor matrix by rotation matrix
     [Input]
+        factor_matrix = [[-1, 1, 2], [-2, 0, -2]]
         rotation_matrix = numpy.array([
             [-0.01098383,  0.91666209],
             [-0.07372826,  0.39770633],
             [ 0.99721788,  0.03950055]])
+    [Output]
+        array([[ 1.93169133, -0.43995466],
+            [-1.97246810, -1.91232528]])
+    """
+    factor_matrix = numpy.atleast_2d(numpy.asarray(factor_matrix, dtype=float))
+
+    return factor_matrix.dot(rotation_matrix).reshape(factor_matrix.shape[0], -1)
+
+
+def get_pca_result(coordinates, *target_data):
+    """
+    Get PCA algorithm result from coordinates of target data(including user data) calculated by `get_pca_coordinates`
+    [Input]
+        coordinates = [
+            [1.9316913344094013, -0.43995466242180009],
+            [-1.972468097093643, -1.9123252796738086]]
         target_data = [
-            {'name': 'User A', 'factor_list': [-1, 1, 2], 'color': '#AEAEAE'}, 
-            {'name': 'User B', 'factor_list': [-2, 0, -2], 'color': '#EEEEEE'}]
+            {'name': 'User A', 'color': '#AEAEAE'}, 
+            {'name': 'User B', 'color': '#EEEEEE'}]
     [Output]
         [{
             'name': 'User A', 
@@ -449,16 +1889,58 @@ def get_pca_result(rotation_matrix, *target_data):
     """
     record = []
 
-    for single_target_data in target_data:
-        factor_list = numpy.array(single_target_data['factor_list'])
-        coordinates = tuple(factor_list.dot(rotation_matrix))
-        record.append("{'name': '" + single_target_data['name'] + "'," \
-                + "'x_coordinate': " + str(coordinates[0]) + "," \
-                + "'y_coordinate': " + str(coordinates[1]) + "," \
-                + "'radius': 20," \
-                +  "'color': '" + single_target_data['color'] + "'}")
+    for single_target_data, single_coordinates in zip(target_data, coordinates):
+        record.append({'name': single_target_data['name'], 
+            'x_coordinate': float(single_coordinates[0]), 
+            'y_coordinate': float(single_coordinates[1]), 
+            'radius': 20, 
+            'color': single_target_data['color']})
+
+    return serialize_record(record)
+
+
+def render_response(data, version):
+    """
+    Render data as JSON bytes and gzip compressed JSON bytes once to serve them directly
+    """
+    rendered = JSONRenderer().render(data)
+    compressor = zlib.compressobj(getattr(settings, 'RESPONSE_GZIP_LEVEL'), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    return {'version': version,
+            'json': rendered,
+            'gzip': compressor.compress(rendered) + compressor.flush()}
 
-    return '[' + ', '.join(record) + ']'
+
+def get_rendered_response(request, rendered_response, last_modified=None):
+    """
+    Get HTTP response of rendered JSON, which is gzip compressed if client accepts it
+    Strong ETag differs by content encoding since compressed bytes are different
+    """
+    if accepts_gzip(request):
+        response = HttpResponse(rendered_response['gzip'], content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+        etag = rendered_response['version'] + '-gzip'
+    else:
+        response = HttpResponse(rendered_response['json'], content_type='application/json')
+        etag = rendered_response['version']
+
+    patch_vary_headers(response, ('Accept-Encoding', ))
+    return set_validators(response, etag, last_modified)
+
+
+def get_not_modified_rendered_response(request, key):
+    """
+    Get `304 Not Modified` response of rendered JSON from version of cache, otherwise None
+    """
+    version, last_modified = get_cache_validators(key)
+    if version is None:
+        return None
+
+    response = get_not_modified_response(request, version + '-gzip' if accepts_gzip(request) else version, last_modified)
+    if response is not None:
+        patch_vary_headers(response, ('Accept-Encoding', ))
+
+    return response
 
 
 def upload_base64_encoded_image_to_cloudinary(base64_encoded_image):
@@ -489,11 +1971,35 @@ def byteify(input):
         return input
 
 
-def get_statics(min_user_id, max_user_id):
+def get_similarities_of_rows(rows):
+    """
+    Get similarities of user to comparison targets from rows of city block distance result in descending order
+    """
+    similarities = []
+    for row in rows:
+        if 'classification' in row and row['classification'] == 'category' and row['category'] == 'all':
+            similarity = {}
+            similarity['name'] = row['name']
+            similarity['similarity'] = row['similarity']
+            similarities.append(similarity)
+        elif 'similarities' in row:
+            similarity = {}
+            temp_similarities = row['similarities']
+            for temp_similarity in temp_similarities:
+                similarity['name'] = temp_similarity.keys()[0]
+                similarity['similarity'] = temp_similarity.values()[0]
+                similarities.append(similarity)
+        else:
+            pass
+
+    return sorted(similarities, key=lambda k: k['similarity'], reverse=True)
+
+
+def iterate_statistics(survey_obj, min_user_id, max_user_id):
     """
-    Get statics of users in specific ID range
+    Iterate statistics of users in specific ID range chunk by chunk, so memory does not grow with count of users
+    Each chunk of users is loaded with bulk queries of users, answers and latest results
     For example,
-    [
         {
             'political_tendency': 'center',
             'supporting_party': 'none',
@@ -504,96 +2010,263 @@ def get_statics(min_user_id, max_user_id):
                 {'name': 'party_b', 'similarity': 86.0},
                 {'name': 'party_a', 'similarity': 41.0}
             ]
-        },
-        {
-            'political_tendency': '',
-            'supporting_party': '',
-            'year_of_birth': '1995',
-            'sex': 'female',
-            'factor_list': [1, 3, -1, 3, 7, 1, ..., -3],
-            'similarities': [
-                {'name': 'party_b', 'similarity': 86.0},
-                {'name': 'party_a', 'similarity': 41.0}
-            ]
         }
-    ]
     """
-    if isinstance(min_user_id, int) == False or min_user_id < 1:
+    if isinstance(survey_obj, Survey) == False:
         raise ValueError('Invalid variable')
 
-    if isinstance(max_user_id, int) == False or max_user_id < 1 or max_user_id > User.objects.latest('id').id:
+    # ID read from DB could be long
+    if isinstance(min_user_id, (int, long)) == False or min_user_id < 1:
         raise ValueError('Invalid variable')
 
-    data = []
-    outfile = open(str(min_user_id) + '_' + str(max_user_id) + '.json', 'w+')
-    users = User.objects.filter(id__gte=min_user_id, id__lte=max_user_id)
-    survey = Survey.objects.get(id=2)
+    if isinstance(max_user_id, (int, long)) == False or max_user_id < min_user_id:
+        raise ValueError('Invalid variable')
 
-    for user in users:
-        single_data = {}
-        
-        supporting_party = user.supporting_party
-        if supporting_party == None:
-            single_data['supporting_party'] = ''
-        else:
-            single_data['supporting_party'] = supporting_party.encode('utf-8')
-        
-        political_tendency = user.political_tendency
-        if political_tendency == None:
-            single_data['political_tendency'] = ''
-        else:
-            single_data['political_tendency'] = political_tendency.encode('utf-8')
-        
-        year_of_birth = user.year_of_birth
-        if year_of_birth == None:
-            single_data['year_of_birth'] = ''
-        else:
-            single_data['year_of_birth'] = str(year_of_birth)
-        
-        sex = user.sex
-        if sex == None:
-            single_data['sex'] = ''
-        else:
-            single_data['sex'] = sex.encode('utf-8')
+    chunk_size = getattr(settings, 'FACTOR_MATRIX_CHUNK_SIZE')
+    last_user_id = min_user_id - 1
+
+    while True:
+        users = list(User.objects.filter(id__gt=last_user_id, id__lte=max_user_id).order_by('id').\
+            values_list('id', 'supporting_party', 'political_tendency', 'year_of_birth', 'sex')[:chunk_size])
+        if len(users) == 0:
+            break
         
-        try:
-            result = Result.objects.filter(user=user, survey=survey)[0]
-            if result.category == 'city_block_distance':
-                record = result.record
-                record = record.replace("'", '"')
-            else:
-                record = ''
-        except:
-            record = ''
+        last_user_id = users[-1][0]
+        users_id_list = [user[0] for user in users]
+        factor_matrix, users_id_array = get_factor_matrix_of_users(survey_obj, users_id_list)
+        rows_index = dict((user_id, index) for index, user_id in enumerate(users_id_array.tolist()))
         
-        user_data = get_survey_data_of_user(user, survey)
-        single_data['factor_list'] = user_data['factor_list']
+        # Latest result of each user, which is used only if it is result of city block distance
+        #   Default ordering of result would be added to GROUP BY, so it is cleared
+        latest_results_id_list = Result.objects.filter(survey=survey_obj, user_id__in=users_id_list).order_by().\
+            values('user_id').annotate(latest_id=Max('id')).values_list('latest_id', flat=True)
+        latest_results = {}
+        for result in Result.objects.filter(id__in=list(latest_results_id_list)).only('id', 'user', 'record', 'record_version', 'category'):
+            if result.user_id not in latest_results or result.id > latest_results[result.user_id].id:
+                latest_results[result.user_id] = result
         
-        similarities = []
-        if record != '':
-            rows = json.loads(record)
-            rows = byteify(rows)
+        for user_id, supporting_party, political_tendency, year_of_birth, sex in users:
+            single_data = {}
+            single_data['supporting_party'] = '' if supporting_party == None else supporting_party.encode('utf-8')
+            single_data['political_tendency'] = '' if political_tendency == None else political_tendency.encode('utf-8')
+            single_data['year_of_birth'] = '' if year_of_birth == None else str(year_of_birth)
+            single_data['sex'] = '' if sex == None else sex.encode('utf-8')
             
-            for row in rows:
-                if 'classification' in row and row['classification'] == 'category' and row['category'] == 'all':
-                    similarity = {}
-                    similarity['name'] = row['name']
-                    similarity['similarity'] = row['similarity']
-                    similarities.append(similarity)
-                elif 'similarities' in row:
-                    similarity = {}
-                    temp_similarities = row['similarities']
-                    for temp_similarity in temp_similarities:
-                        similarity['name'] = temp_similarity.keys()[0]
-                        similarity['similarity'] = temp_similarity.values()[0]
-                        similarities.append(similarity)
-                else:
+            result = latest_results.get(user_id)
+            rows = []
+            if result is not None and result.category == 'city_block_distance':
+                try:
+                    rows = byteify(get_rows_of_result(result))
+                except ValueError:
                     pass
+            
+            factors = factor_matrix[rows_index[user_id]]
+            single_data['factor_list'] = factors[factors != UNANSWERED_FACTOR].tolist()
+            single_data['similarities'] = get_similarities_of_rows(rows)
+            
+            yield single_data
+
+
+# Columns of analytics snapshot which are encoded as codes of categories in meta
+#   Code of empty value is -1
+ANALYTICS_CATEGORICAL_COLUMNS = ('sex', 'political_tendency', 'supporting_party')
+
+
+def get_analytics_snapshot_directory(survey_id):
+    """
+    Get directory of analytics snapshot of survey, where `meta.json` lists part directories of columns under `parts`
+    """
+    return os.path.join(getattr(settings, 'ANALYTICS_SNAPSHOT_DIR'), 'survey' + str(survey_id))
+
+
+def get_analytics_snapshot_meta(survey_id):
+    """
+    Get meta of latest analytics snapshot of survey, or None if snapshot is not created yet
+    """
+    try:
+        with open(os.path.join(get_analytics_snapshot_directory(survey_id), 'meta.json'), 'rb') as f:
+            return json.load(f)
+    except IOError:
+        return None
+
+
+def load_analytics_snapshot_part(survey_id, part_id, mmap_mode='r'):
+    """
+    Load columns of part of analytics snapshot
+    """
+    part_directory = os.path.join(get_analytics_snapshot_directory(survey_id), 'parts', part_id)
+    columns = {}
+    for filename in os.listdir(part_directory):
+        if filename.endswith('.npy'):
+            columns[filename[:-4]] = numpy.load(os.path.join(part_directory, filename), mmap_mode=mmap_mode)
+
+    return columns
+
+
+def load_analytics_snapshot(survey_id, mmap_mode='r'):
+    """
+    Load latest analytics snapshot of survey
+    Columns of parts are concatenated, so they are memory-mapped only when snapshot has single part(=right after compaction)
+    Return meta and columns, or None if snapshot is not created yet
+    For example,
+        (
+            {
+                'questions_version': version of questions,
+                'questions_id': [1, 2, 3],
+                'last_participation_id': 1534,
+                'rows': 2,
+                'parts': ['5f1d...', '9ab2...'],
+                'categories': {'sex': ['male', 'female'], ...},
+                'created_at': '2016-04-01T12:00:00+00:00'
+            },
+            
+            {
+                'users_id': array([3, 8]),
+                'questions_id': array([1, 2, 3]),
+                'factors': array([[1, -3, 7], [2, 0, -128]], dtype=int8),
+                'sex': array([0, -1], dtype=int16),
+                'year_of_birth': array([1995, 0], dtype=int16),
+                ...
+            }
+        )
+    """
+    meta = get_analytics_snapshot_meta(survey_id)
+    if meta is None or len(meta['parts']) == 0:
+        return None
+
+    parts = [load_analytics_snapshot_part(survey_id, part_id, mmap_mode) for part_id in meta['parts']]
+    if len(parts) == 1:
+        columns = parts[0]
+    else:
+        columns = dict((name, numpy.concatenate([part[name] for part in parts])) for name in parts[0].keys())
+    columns['questions_id'] = numpy.array(meta['questions_id'], dtype=numpy.int64)
+
+    return meta, columns
+
+
+def write_analytics_snapshot_part(survey_id, columns):
+    """
+    Write columns into new part directory of analytics snapshot
+    Part is not read until it is listed in meta by `write_analytics_snapshot`
+    Return ID of part
+    """
+    part_id = uuid4().hex
+    part_directory = os.path.join(get_analytics_snapshot_directory(survey_id), 'parts', part_id)
+    os.makedirs(part_directory)
+
+    for name, column in columns.iteritems():
+        numpy.save(os.path.join(part_directory, name + '.npy'), column)
+
+    return part_id
+
+
+def write_analytics_snapshot(survey_id, meta):
+    """
+    Replace meta of analytics snapshot atomically, so readers see either previous parts or new parts
+    Parts which are listed in neither new meta nor previous meta are removed, 
+        so readers which loaded previous meta can still open its parts until next write
+    """
+    directory = get_analytics_snapshot_directory(survey_id)
+    previous_meta = get_analytics_snapshot_meta(survey_id)
+
+    temporary_path = os.path.join(directory, 'meta.json.' + uuid4().hex)
+    with open(temporary_path, 'wb') as f:
+        json.dump(meta, f)
+    os.rename(temporary_path, os.path.join(directory, 'meta.json'))
+
+    used_parts = set(meta['parts']) | set(previous_meta['parts'] if previous_meta is not None else [])
+    for part_id in os.listdir(os.path.join(directory, 'parts')):
+        if part_id not in used_parts:
+            shutil.rmtree(os.path.join(directory, 'parts', part_id), ignore_errors=True)
+
+
+def get_analytics_columns_of_users(survey_obj, users_id_list, categories):
+    """
+    Get analytics columns of users in given order, where factor matrix is aligned with demographic columns
+    New values of categorical columns are appended to categories in place
+    """
+    factor_matrix, users_id_array = get_factor_matrix_of_users(survey_obj, users_id_list)
+    rows_index = dict((user_id, index) for index, user_id in enumerate(users_id_array.tolist()))
+    users = dict((user[0], user[1:]) for user in User.objects.filter(id__in=users_id_list).\
+        values_list('id', 'sex', 'year_of_birth', 'political_tendency', 'supporting_party', 'economic_score'))
+
+    columns = {'users_id': numpy.array(users_id_list, dtype=numpy.int64),
+            'factors': factor_matrix[[rows_index[user_id] for user_id in users_id_list]].reshape(-1, factor_matrix.shape[1]),
+            'year_of_birth': numpy.zeros(len(users_id_list), dtype=numpy.int16),
+            'economic_score': numpy.zeros(len(users_id_list), dtype=numpy.int32)}
+    for name in ANALYTICS_CATEGORICAL_COLUMNS:
+        columns[name] = numpy.empty(len(users_id_list), dtype=numpy.int16)
+        columns[name].fill(-1)
+
+    for index, user_id in enumerate(users_id_list):
+        if user_id not in users:
+            continue
         
-        sorted_similarities = sorted(similarities, key=lambda k: k['similarity'], reverse=True) 
-        single_data['similarities'] = sorted_similarities
+        sex, year_of_birth, political_tendency, supporting_party, economic_score = users[user_id]
+        values = {'sex': sex, 'political_tendency': political_tendency, 'supporting_party': supporting_party}
+        for name in ANALYTICS_CATEGORICAL_COLUMNS:
+            if values[name] is None or values[name] == '':
+                continue
+            if values[name] not in categories[name]:
+                categories[name].append(values[name])
+            columns[name][index] = categories[name].index(values[name])
         
-        data.append(single_data)
+        columns['year_of_birth'][index] = year_of_birth or 0
+        columns['economic_score'][index] = economic_score
+
+    return columns
+
+
+def create_analytics_snapshot(survey_obj, full=False):
+    """
+    Create columnar analytics snapshot of answers and demographics of users who completed survey
+    Users who completed survey after latest snapshot are written as new part, so each run costs only new rows
+    Parts are compacted into one when they are more than `ANALYTICS_SNAPSHOT_MAX_PARTS`, 
+        and whole snapshot is rebuilt when questions are changed
+    Answers changed after user is added to snapshot are kept as they were until whole snapshot is rebuilt
+    Return count of appended rows
+    """
+    if isinstance(survey_obj, Survey) == False:
+        raise ValueError('Invalid variable')
+
+    questions = get_questions_of_survey(survey_obj)
+    version = get_cache_version('survey:' + str(survey_obj.id) + ':questions')
+    meta = get_analytics_snapshot_meta(survey_obj.id)
+
+    if full == True or meta is None or meta['questions_version'] != version:
+        meta = {'questions_version': version,
+                'questions_id': [question['id'] for question in questions],
+                'last_participation_id': 0,
+                'rows': 0,
+                'parts': [],
+                'categories': dict((name, []) for name in ANALYTICS_CATEGORICAL_COLUMNS)}
+
+    # Participation ID only increases, so it marks users who completed survey after latest snapshot
+    participations = Survey.participants.through.objects.filter(survey_id=survey_obj.id, id__gt=meta['last_participation_id'])
+    last_participation_id = participations.aggregate(Max('id'))['id__max']
+    if last_participation_id is None:
+        return 0
+
+    chunk_size = getattr(settings, 'FACTOR_MATRIX_CHUNK_SIZE')
+    users_id_list = list(participations.filter(id__lte=last_participation_id).order_by('id').values_list('user_id', flat=True))
+    chunks = []
+    for start in range(0, len(users_id_list), chunk_size):
+        chunks.append(get_analytics_columns_of_users(survey_obj, users_id_list[start:start + chunk_size], meta['categories']))
+
+    # Codes of categories are only appended to meta, so codes in previous parts stay valid
+    columns = dict((name, numpy.concatenate([chunk[name] for chunk in chunks])) for name in chunks[0].keys())
+    parts = meta['parts'] + [write_analytics_snapshot_part(survey_obj.id, columns)]
+
+    # Compaction reads whole snapshot, but only once in `ANALYTICS_SNAPSHOT_MAX_PARTS` runs
+    if len(parts) > getattr(settings, 'ANALYTICS_SNAPSHOT_MAX_PARTS'):
+        loaded_parts = [load_analytics_snapshot_part(survey_obj.id, part_id) for part_id in parts]
+        parts = [write_analytics_snapshot_part(survey_obj.id, 
+            dict((name, numpy.concatenate([part[name] for part in loaded_parts])) for name in loaded_parts[0].keys()))]
+
+    meta['parts'] = parts
+    meta['last_participation_id'] = last_participation_id
+    meta['rows'] += len(users_id_list)
+    meta['created_at'] = timezone.now().isoformat()
+    write_analytics_snapshot(survey_obj.id, meta)
 
-    json.dump(data, outfile)
-    outfile.close()
+    return len(users_id_list)
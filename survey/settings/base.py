@@ -143,7 +143,9 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
-    )
+    ),
+    # Respond 503 instead of 500 when cache is not rebuilt in time
+    'EXCEPTION_HANDLER': 'main.views.handle_exception'
 }
 
 # Django REST framework JWT settings
@@ -196,6 +198,65 @@ USE_CAPTCHA = False
 # Time-to-live for cache
 CACHE_TTL = 60 * 60 * 24 * 365    # 1 year
 
+# Time-to-live for lock of cache which is updated in place
+CACHE_LOCK_TIMEOUT = 10     # 10 seconds
+
+# Only one process rebuilds cache at once while others wait for the new value until `CACHE_BUILD_WAIT`
+#   Then they wait for the lock once more for `CACHE_BUILD_WAIT` and fail rather than queueing behind slow rebuilding
+CACHE_BUILD_LOCK_TIMEOUT = 60   # 1 minute
+CACHE_BUILD_WAIT = 5    # 5 seconds
+
+# Keep survey cache in memory of each process as well, which is invalidated through Redis pub/sub channel
+USE_LOCAL_CACHE = True
+LOCAL_CACHE_MAX_ENTRIES = 256
+LOCAL_CACHE_TTL = 60 * 5    # 5 minutes
+CACHE_INVALIDATION_CHANNEL = 'survey:cache_invalidation'
+
+# Map matrices of local cache from `.npy` files in shared memory, so processes on a node share one copy of each version
+USE_SHARED_MATRICES = False
+SHARED_MATRIX_DIR = '/dev/shm/survey'
+
+# Compression level of pre-rendered responses (1: fastest ~ 9: smallest)
+RESPONSE_GZIP_LEVEL = 9
+
+# Weight of probabilistic early refresh of cache (Larger value refreshes earlier)
+CACHE_EARLY_REFRESH_BETA = 1.0
+
+# How principal components of rotation matrix are computed ('eigh': whole spectrum, 'randomized': only top components)
+#   Randomized axes are validated against `PCA_AXES_TOLERANCE`, otherwise whole spectrum is decomposed instead
+PCA_ENGINE = 'eigh'
+PCA_OVERSAMPLING = 10
+PCA_POWER_ITERATIONS = 7
+PCA_RANDOM_SEED = 0
+PCA_AXES_TOLERANCE = 1e-6
+
+# `create_rotation_matrix` task recomputes rotation matrix of survey only after `ROTATION_MATRIX_MIN_COMPLETIONS` users completed it
+#   New rotation matrix is saved only if any principal axis drifts more than `ROTATION_MATRIX_DRIFT_TOLERANCE` (1 - |cosine|)
+ROTATION_MATRIX_MIN_COMPLETIONS = 100
+ROTATION_MATRIX_DRIFT_TOLERANCE = 1e-3
+
+# Directory of columnar analytics snapshots of surveys which are appended by `create_analytics_snapshots` task
+#   Each run writes new rows as part, and parts are compacted into one when they are more than `ANALYTICS_SNAPSHOT_MAX_PARTS`
+ANALYTICS_SNAPSHOT_DIR = os.path.join(ROOT_DIR, 'snapshots')
+ANALYTICS_SNAPSHOT_MAX_PARTS = 16
+
+# Count of users whose answers are loaded by one query when building factor matrix
+FACTOR_MATRIX_CHUNK_SIZE = 1000
+
+# Buffer answers in cache and flush them to DB periodically with `flush_answer_buffers` task
+USE_ANSWER_BUFFER = False
+ANSWER_BUFFER_FLUSH_BATCH_SIZE = 500
+
+# Time-to-live for result record shared by users with identical inputs
+#   Least recently used records are evicted earlier if Redis runs with `maxmemory-policy volatile-lru`
+#   DO NOT use `allkeys-lru`, which would evict keys without TTL such as answer buffers, participation bitmaps and counters
+#   Hit rate of records and eviction policy of Redis are printed by `result_cache_stats` command
+RESULT_CACHE_TTL = 60 * 60 * 24 * 7    # 1 week
+
+# Create result with `create_result` task and let client poll its status until `RESULT_TASK_TIMEOUT`
+USE_ASYNC_RESULT = False
+RESULT_TASK_TIMEOUT = 60 * 5    # 5 minutes
+
 # Domain name
 DOMAIN_NAME = config.get('django', 'domain_name')
 
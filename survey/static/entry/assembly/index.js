@@ -7,6 +7,7 @@ require('bootstrap-webpack');
 var setCSRFToken = require('../../module/setCSRFToken.js');
 var setAuthToken = require('../../module/setAuthToken.js');
 var clearAuthToken = require('../../module/clearAuthToken.js');
+var waitForResult = require('../../module/waitForResult.js');
 
 // Global variables
 var surveyID = 1;
@@ -82,9 +83,9 @@ $(document).on('click', '.landing__btn--result', function() {
     data: formData,
     contentType: false,
     processData: false
-  }).done(function(data) {
+  }).then(waitForResult).done(function(resultID) {
     // Move to result page
-    location.href = '/assembly/result/' + data.id + '/';
+    location.href = '/assembly/result/' + resultID + '/';
   }).fail(function() {
     btn.button('reset');
     $('#loading-icon').addClass('hidden');
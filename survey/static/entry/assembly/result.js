@@ -2571,8 +2571,9 @@ $(document).ready(function() {
     // / When user is not an owner of result
     if (data.user != localStorage.getItem('user_id')) $('#go-to-survey-landding-page-btn').text('나도 해보기');
 
-    // Parse record as JSON format 
-    rows = JSON.parse(data.record.replace(/'/g, '"'));
+    // Parse record as JSON format (Legacy record is stored as Python literal string)
+    if (data.record_version >= 2) rows = JSON.parse(data.record);
+    else rows = JSON.parse(data.record.replace(/'/g, '"'));
 
     // Reordering in descending order
     rows = _.orderBy(rows, 'similarity', 'desc');
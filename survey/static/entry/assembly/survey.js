@@ -9,6 +9,7 @@ require('jquery-slimscroll');
 var setCSRFToken = require('../../module/setCSRFToken.js');
 var setAuthToken = require('../../module/setAuthToken.js');
 var clearAuthToken = require('../../module/clearAuthToken.js');
+var waitForResult = require('../../module/waitForResult.js');
 
 // Global variables
 var surveyID = 1;
@@ -94,9 +95,9 @@ $(document).on('click', '.survey__submit-btn', function() {
       data: formData,
       contentType: false,
       processData: false
-    }).done(function(data) {
+    }).then(waitForResult).done(function(resultID) {
       // Move to result page
-      location.href = '/assembly/result/' + data.id + '/';
+      location.href = '/assembly/result/' + resultID + '/';
     }).fail(function() {
       $submitBtn.button('reset');
     });
@@ -7,6 +7,7 @@ require('bootstrap-webpack');
 var setCSRFToken = require('../../module/setCSRFToken.js');
 var setAuthToken = require('../../module/setAuthToken.js');
 var clearAuthToken = require('../../module/clearAuthToken.js');
+var waitForResult = require('../../module/waitForResult.js');
 
 // Global variables
 var surveyID = 2;
@@ -85,9 +86,9 @@ $(document).on('click', '.landing__btn--result', function() {
     data: formData,
     contentType: false,
     processData: false
-  }).done(function(data) {
+  }).then(waitForResult).done(function(resultID) {
     // Move to result page
-    location.href = '/party/result/' + data.id + '/';
+    location.href = '/party/result/' + resultID + '/';
   }).fail(function() {
     btn.button('reset');
     $('#loading-icon').addClass('hidden');
@@ -325,8 +325,8 @@ $(document).ready(function() {
     
     var categories = ['all', '사회/언론', '생태/다양성', '경제/노동', '외교/안보'];
     
-    // Parse record as JSON format 
-    var record = JSON.parse(data.record.replace(/'/g, '"'));
+    // Parse record as JSON format (Legacy record is stored as Python literal string)
+    var record = data.record_version >= 2 ? JSON.parse(data.record) : JSON.parse(data.record.replace(/'/g, '"'));
     
     // Filter factor sum data
     var factorSumList = _.filter(record, {'classification': 'factor_sum'});
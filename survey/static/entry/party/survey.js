@@ -9,6 +9,7 @@ require('jquery-slimscroll');
 var setCSRFToken = require('../../module/setCSRFToken.js');
 var setAuthToken = require('../../module/setAuthToken.js');
 var clearAuthToken = require('../../module/clearAuthToken.js');
+var waitForResult = require('../../module/waitForResult.js');
 
 // Global variables
 var surveyID = 2;
@@ -81,9 +82,9 @@ $(document).on('click', '.survey__submit-btn', function() {
       data: formData,
       contentType: false,
       processData: false
-    }).done(function(data) {
+    }).then(waitForResult).done(function(resultID) {
       // Move to result page
-      location.href = '/party/result/' + data.id + '/';
+      location.href = '/party/result/' + resultID + '/';
     }).fail(function() {
       $submitBtn.button('reset');
     });
@@ -0,0 +1,33 @@
+'use strict';
+
+// Load modules
+var $ = require('jquery');
+
+// Resolve with ID of result, polling status of result which is being created in background
+module.exports = function waitForResult(data) {
+  var deferred = $.Deferred();
+
+  if (data.pending_id === undefined) {
+    return deferred.resolve(data.id).promise();
+  }
+
+  var poll = function() {
+    $.ajax({
+      url: '/api/results/status/' + data.pending_id + '/',
+      type: 'GET'
+    }).done(function(status) {
+      if (status.state === 'SUCCESS') {
+        deferred.resolve(status.id);
+      } else if (status.state === 'FAILURE') {
+        deferred.reject();
+      } else {
+        setTimeout(poll, 1000);
+      }
+    }).fail(function() {
+      deferred.reject();
+    });
+  };
+  poll();
+
+  return deferred.promise();
+}